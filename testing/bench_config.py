@@ -0,0 +1,75 @@
+"""
+Benchmark config file I/O for a typical command.
+
+Replays the config reads and writes of a command that checks VM readiness
+and then talks to LXD, counting how many times config.json is opened and
+parsed, with and without the in-process cache.
+
+    $ python -m testing.bench_config
+"""
+import json
+import time
+from unittest import mock
+
+from testing.fixtures import temporary_config
+from yurt import config
+
+
+READS = [
+    config.Key.vm_name,
+    config.Key.readiness_fingerprint,
+    config.Key.ssh_port,
+    config.Key.lxd_port,
+    config.Key.is_lxd_initialized,
+    config.Key.lxd_port,
+    config.Key.warm_pools,
+    config.Key.lxd_port,
+]
+WRITES = [(config.Key.readiness_fingerprint, "fingerprint")]
+REPEAT = 200
+
+
+def uncached_read_config():
+    with open(config._config_file, "r") as f:
+        return json.load(f)
+
+
+def in_place_write_config(values):
+    with open(config._config_file, "w") as f:
+        json.dump(values, f)
+
+
+def command():
+    for key in READS:
+        config.get_config(key)
+    for key, value in WRITES:
+        config.set_config(key, value)
+
+
+def measure(**patches):
+    with temporary_config(vm_name="yurt-bench", lxd_port=8443, ssh_port=2222), \
+            mock.patch("json.load", wraps=json.load) as load, \
+            mock.patch.dict(vars(config), patches):
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            command()
+        elapsed = time.perf_counter() - start
+
+    return elapsed / REPEAT, load.call_count / REPEAT
+
+
+def main():
+    print(f"{len(READS)} reads and {len(WRITES)} write(s) per command")
+    print(f"{'':>8}  {'Parses':>8}  {'Time (ms)':>10}")
+
+    for label, patches in [
+        ("Before", {"_read_config": uncached_read_config,
+                    "_write_config": in_place_write_config}),
+        ("After", {}),
+    ]:
+        elapsed, parses = measure(**patches)
+        print(f"{label:>8}  {parses:>8.2f}  {elapsed * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark 'yurt list' latency against container count.
+
+Compares the single recursive request made by lxc.list_ with the previous
+approach of one state request per container, using a fake LXD server that
+adds a fixed latency per request.
+
+    $ python -m testing.bench_list
+"""
+import time
+
+from testing.fixtures import FakeLXD, temporary_config
+from yurt import lxc
+from yurt.lxc import util as lxc_util
+
+
+LATENCY = 0.005  # seconds per request
+COUNTS = [1, 10, 50, 100, 200]
+
+
+def list_one_request_per_instance():
+    response = lxc_util.api_request(
+        "GET", "/instances", params={"recursion": 1})
+    for instance in response.json()["metadata"]:
+        lxc_util.api_request("GET", f"/instances/{instance['name']}/state")
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    print(f"Per-request latency: {LATENCY * 1000:.0f}ms")
+    print(f"{'Containers':>10}  {'N+1 (ms)':>10}  {'recursion=2 (ms)':>16}")
+
+    for count in COUNTS:
+        lxc_util.reset_pylxd_client()
+
+        with FakeLXD(latency=LATENCY) as fake_lxd, \
+                temporary_config(lxd_port=fake_lxd.port):
+            for i in range(count):
+                fake_lxd.add_instance(f"c{i}")
+
+            before = timed(list_one_request_per_instance)
+            after = timed(lxc.list_)
+
+        print(f"{count:>10}  {before * 1000:>10.1f}  {after * 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark VBoxManage invocations for a typical sequence of vbox calls.
+
+Runs the host-only network setup done by 'yurt vm init' followed by the
+state checks of a few commands against the fake VBoxManage, with and
+without snapshots. Without snapshots every query runs VBoxManage and
+parses its output again.
+
+    $ python -m testing.bench_vbox
+"""
+import time
+from unittest import mock
+
+from testing.fixtures import FakeVBoxManage, temporary_config
+from yurt import config, vm
+from yurt.vm import vbox
+
+
+STATE_CHECKS = 10
+
+
+def sequence():
+    interface = vbox.create_hostonly_interface()
+    vbox.get_interface_info(interface)
+    for _ in range(STATE_CHECKS):
+        vm.state()
+        vm.info()
+
+
+def measure(ttl):
+    with FakeVBoxManage(vms={"yurt": {}}, hostonlyifs=2) as fake, \
+            temporary_config(vm_name="yurt"), \
+            mock.patch.object(config, "vm_state_ttl", ttl):
+        start = time.perf_counter()
+        sequence()
+        return time.perf_counter() - start, len(fake.calls)
+
+
+def main():
+    print(f"Network setup and {STATE_CHECKS} state checks")
+    print(f"{'':>10}  {'Invocations':>11}  {'Time (ms)':>10}")
+
+    for label, ttl in [("Uncached", 0), ("Snapshots", config.vm_state_ttl)]:
+        elapsed, calls = measure(ttl)
+        print(f"{label:>10}  {calls:>11}  {elapsed * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
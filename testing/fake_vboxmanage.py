@@ -0,0 +1,114 @@
+"""
+Stand-in for VBoxManage with enough behavior for yurt's vbox module.
+
+State is kept in the JSON file named by $FAKE_VBOXMANAGE_STATE, and every
+invocation is appended to its "calls". See fixtures.FakeVBoxManage.
+
+    $ FAKE_VBOXMANAGE_STATE=state.json python fake_vboxmanage.py -q list vms
+"""
+import json
+import os
+import sys
+
+
+def host_only_interface(index):
+    name = "VirtualBox Host-Only Ethernet Adapter" + (f" #{index + 1}" if index else "")
+    return "\n".join([
+        f"Name:            {name}",
+        "GUID:            786f6276-656e-4074-8000-0a0027000000",
+        "DHCP:            Disabled",
+        f"IPAddress:       192.168.{56 + index}.1",
+        "NetworkMask:     255.255.255.0",
+        "IPV6Address:     fe80::a5d2:5e1:4bcc:3c1c",
+        "IPV6NetworkMaskPrefixLength: 64",
+        "HardwareAddress: 0a:00:27:00:00:00",
+        "MediumType:      Ethernet",
+        "Wireless:        No",
+        "Status:          Up",
+        f"VBoxNetworkName: HostInterfaceNetworking-{name}",
+    ]), name
+
+
+def show_vm_info(vm):
+    lines = []
+    for key, value in vm.items():
+        if key.isidentifier():
+            lines.append(f'{key}="{value}"' if not value.isdigit() else f"{key}={value}")
+        else:
+            lines.append(f'"{key}"="{value}"')
+    return "\n".join(lines)
+
+
+def fail(message):
+    print(f"VBoxManage: error: {message}", file=sys.stderr)
+    sys.exit(1)
+
+
+def main(args, state):
+    if args[:1] == ["-q"]:
+        args = args[1:]
+    state["calls"].append(args)
+    vms = state["vms"]
+
+    if args == ["list", "vms"]:
+        for name, vm in vms.items():
+            print(f'"{name}" {{{vm["UUID"]}}}')
+
+    elif args == ["list", "hostonlyifs"]:
+        print("\n\n".join(
+            host_only_interface(i)[0] for i in range(state["hostonlyifs"])))
+        print()
+
+    elif args[:2] == ["hostonlyif", "create"]:
+        _, name = host_only_interface(state["hostonlyifs"])
+        state["hostonlyifs"] += 1
+        print(f"Interface '{name}' was successfully created")
+
+    elif args[0] == "showvminfo":
+        if args[1] not in vms:
+            fail(f"Could not find a registered machine named '{args[1]}'")
+        print(show_vm_info(vms[args[1]]))
+
+    elif args[0] == "modifyvm":
+        vm = vms.get(args[1]) or fail(f"Could not find a registered machine named '{args[1]}'")
+        option = None
+        for arg in args[2:]:
+            if arg.startswith("--"):
+                option = arg[2:]
+                vm[option] = []
+            else:
+                vm[option].append(arg)
+        for option, values in vm.items():
+            if isinstance(values, list):
+                # showvminfo prints multi-argument settings comma separated,
+                # with the UART port as 0x03f8 rather than 0x3F8.
+                if option.startswith("uart") and not option.startswith("uartmode"):
+                    values[0] = f"0x{int(values[0], 16):04x}"
+                vm[option] = ",".join(values)
+
+    elif args[0] == "startvm":
+        vms[args[1]]["VMState"] = "running"
+
+    elif args[0] == "controlvm":
+        vm = vms[args[1]]
+        if args[2] in ["poweroff", "acpipowerbutton"]:
+            vm["VMState"] = "poweroff"
+        elif args[2] == "natpf1":
+            rules = [k for k in vm if k.startswith("Forwarding(")]
+            if args[3] == "delete":
+                for rule in rules:
+                    if vm[rule].startswith(f"{args[4]},"):
+                        del vm[rule]
+            else:
+                vm[f"Forwarding({len(rules)})"] = args[3]
+
+
+if __name__ == "__main__":
+    state_file = os.environ["FAKE_VBOXMANAGE_STATE"]
+    with open(state_file) as f:
+        state = json.load(f)
+    try:
+        main(sys.argv[1:], state)
+    finally:
+        with open(state_file, "w") as f:
+            json.dump(state, f)
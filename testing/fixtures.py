@@ -0,0 +1,421 @@
+"""
+Local fixtures for tests and benchmarks that run without the Yurt VM.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from yurt import config
+
+
+@contextmanager
+def temporary_config(**values):
+    """
+    Point yurt's config at a throwaway directory.
+    values: Initial config values, by config.Key name.
+    """
+    config_dir = tempfile.mkdtemp()
+
+    # Relocate every path derived from the config directory.
+    original_dir = config.config_dir
+    saved = {
+        name: value for name, value in vars(config).items()
+        if isinstance(value, str) and value.startswith(original_dir)
+    }
+    for name, value in saved.items():
+        setattr(config, name, config_dir + value[len(original_dir):])
+
+    with open(config._config_file, "w") as f:
+        json.dump(values, f)
+
+    try:
+        yield config_dir
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+
+class FixtureServer:
+    """
+    Serve requests on a random local port from a background thread.
+    Subclasses implement handle(request) where request is the
+    BaseHTTPRequestHandler for the current request.
+    """
+
+    def __init__(self):
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fixture.handle(self)
+
+            def do_POST(self):
+                fixture.handle(self)
+
+            def do_PUT(self):
+                fixture.handle(self)
+
+            def do_PATCH(self):
+                fixture.handle(self)
+
+            def do_DELETE(self):
+                fixture.handle(self)
+
+            def do_HEAD(self):
+                fixture.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.request_count = 0
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        raise NotImplementedError
+
+    @staticmethod
+    def send_json(request: BaseHTTPRequestHandler, body, status=200, headers=None):
+        data = json.dumps(body).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            request.send_header(k, v)
+        request.end_headers()
+        request.wfile.write(data)
+
+
+class FakeLXD(FixtureServer):
+    """
+    Minimal stand-in for the parts of the LXD REST API yurt uses.
+    - latency: float
+        Seconds added to each request, e.g. to model the socat proxy.
+    - include_state: bool
+        Include instance state in recursion=2 listings, like LXD 4.0+ does.
+    - operation_waits: int
+        Number of timed out /wait requests before an operation completes.
+    """
+
+    def __init__(self, latency=0.0, include_state=True, operation_waits=0):
+        super().__init__()
+        self.latency = latency
+        self.include_state = include_state
+        self.operation_waits = operation_waits
+        self.instances = {}
+        self.operations = {}
+        self.images = {}
+        self.created_from = {}
+        self.pulled = {}
+        self.image_store = set()
+        self.server_pid = 1000
+        self.networks = {"yurt-int": "network-v1"}
+        self.profiles = {"yurt": "profile-v1"}
+        self._lock = threading.Lock()
+
+    def add_instance(self, name, status="Running", ip_address="192.168.1.10"):
+        self.instances[name] = {
+            "name": name,
+            "status": status,
+            "config": {
+                "image.architecture": "amd64",
+                "image.os": "Alpine",
+                "image.release": "3.11",
+            },
+            "state": {
+                "status": status,
+                "network": {
+                    "eth0": {
+                        "addresses": [
+                            {"family": "inet6", "address": "fe80::1"},
+                            {"family": "inet", "address": ip_address},
+                        ]
+                    }
+                },
+            },
+        }
+
+    @staticmethod
+    def sync(metadata):
+        return {"type": "sync", "status": "Success", "status_code": 200,
+                "metadata": metadata}
+
+    def send_error(self, request, message, status):
+        self.send_json(request, {"type": "error", "error": message,
+                                 "error_code": status}, status=status)
+
+    def send_operation(self, request, error=None, metadata=None):
+        """
+        Respond with an operation. Its effects have already been applied, but
+        it reports as running for `operation_waits` wait requests.
+        """
+        import uuid
+
+        operation_id = str(uuid.uuid4())
+        operation = {
+            "id": operation_id,
+            "description": "Fake operation",
+            "status": "Failure" if error else "Success",
+            "status_code": 400 if error else 200,
+            "err": error or "",
+            "metadata": metadata,
+        }
+        with self._lock:
+            self.operations[operation_id] = [operation, self.operation_waits]
+
+        self.send_json(request, {
+            "type": "async", "status": "Operation created", "status_code": 100,
+            "operation": f"/1.0/operations/{operation_id}",
+            "metadata": self.operation_state(operation_id)
+        }, status=202)
+
+    def operation_state(self, operation_id, wait=False):
+        with self._lock:
+            entry = self.operations[operation_id]
+            if wait and entry[1] > 0:
+                entry[1] -= 1
+                time.sleep(0.01)
+            operation, waits_left = entry
+
+        if waits_left:
+            return dict(operation, status="Running", status_code=103,
+                        err="", metadata={"download_progress": "50%"})
+        return operation
+
+    def handle(self, request):
+        self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlparse(request.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+
+        if parts == ["1.0"]:
+            return self.send_json(request, self.sync({
+                "api_extensions": [],
+                "environment": {"certificate_fingerprint": "fake-lxd",
+                                "server_pid": self.server_pid}}))
+
+        for collection in ["networks", "profiles"]:
+            etags = getattr(self, collection)
+            if parts[:2] == ["1.0", collection] and parts[2:] and parts[2] in etags:
+                return self.send_json(request, self.sync({"name": parts[2]}),
+                                      headers={"ETag": etags[parts[2]]})
+
+        if parts[:2] == ["1.0", "instances"]:
+            return self.handle_instances(request, parts[2:], query)
+
+        if parts[:2] == ["1.0", "images"]:
+            return self.handle_images(request, parts[2:])
+
+        if parts[:2] == ["1.0", "operations"] and len(parts) > 2 \
+                and parts[2] in self.operations:
+            wait = parts[3:] == ["wait"]
+            if wait and "timeout" not in query:
+                with self._lock:
+                    self.operations[parts[2]][1] = 0
+            return self.send_json(request, self.sync(
+                self.operation_state(parts[2], wait=wait)))
+
+        self.send_error(request, "not found", 404)
+
+    def read_json(self, request):
+        length = int(request.headers.get("Content-Length") or 0)
+        return json.loads(request.rfile.read(length) or b"{}")
+
+    def handle_instances(self, request, parts, query):
+        recursion = int(query.get("recursion", ["0"])[0])
+
+        if not parts:
+            if request.command == "POST":
+                return self.create_instance(request)
+            if recursion == 0:
+                body = [f"/1.0/instances/{n}" for n in self.instances]
+            else:
+                body = []
+                for instance in self.instances.values():
+                    instance = dict(instance)
+                    if recursion < 2 or not self.include_state:
+                        del instance["state"]
+                    body.append(instance)
+            return self.send_json(request, self.sync(body))
+
+        instance = self.instances.get(parts[0])
+        if not instance:
+            return self.send_error(request, "not found", 404)
+
+        if parts[1:] == ["state"]:
+            if request.command == "PUT":
+                return self.change_state(request, instance)
+            return self.send_json(request, self.sync(instance["state"]))
+
+        if request.command == "POST":
+            return self.rename_instance(request, instance)
+
+        if request.command == "PATCH":
+            with self._lock:
+                instance["config"].update(self.read_json(request)["config"])
+            return self.send_json(request, self.sync({}))
+
+        if request.command == "DELETE":
+            if instance["status"] == "Running":
+                return self.send_operation(
+                    request, error="Instance is running")
+            with self._lock:
+                del self.instances[instance["name"]]
+            return self.send_operation(request)
+
+        instance = dict(instance)
+        del instance["state"]
+        self.send_json(request, self.sync(instance))
+
+    def handle_images(self, request, parts):
+        if request.command == "POST":
+            body = self.read_json(request)
+            alias = body["source"]["alias"]
+            if alias not in self.images:
+                return self.send_operation(
+                    request, error="The requested image couldn't be found")
+            with self._lock:
+                self.pulled[alias] = body
+                self.image_store.add(self.images[alias])
+            return self.send_operation(request)
+
+        if parts and parts[0] in self.image_store:
+            return self.send_json(request, self.sync({"fingerprint": parts[0]}))
+        self.send_error(request, "not found", 404)
+
+    def rename_instance(self, request, instance):
+        name = self.read_json(request)["name"]
+        error = None
+        with self._lock:
+            if instance["status"] == "Running":
+                error = "Renaming of running instance not allowed"
+            elif name in self.instances:
+                error = "Name already in use"
+            else:
+                del self.instances[instance["name"]]
+                instance["name"] = name
+                self.instances[name] = instance
+        self.send_operation(request, error=error)
+
+    def change_state(self, request, instance):
+        action = self.read_json(request)["action"]
+        status = {"start": "Running", "stop": "Stopped"}[action]
+        if instance["status"] == status:
+            return self.send_operation(
+                request, error=f"The instance is already {status.lower()}")
+
+        instance["status"] = instance["state"]["status"] = status
+        self.send_operation(request)
+
+    def create_instance(self, request):
+        body = self.read_json(request)
+        name, source = body["name"], body["source"]
+
+        if source["type"] == "copy":
+            if source["source"] not in self.instances:
+                return self.send_operation(request, error="Instance not found")
+            fingerprint = self.instances[source["source"]]["config"].get(
+                "volatile.base_image")
+        elif "fingerprint" in source:
+            fingerprint = source["fingerprint"]
+            if fingerprint not in self.images.values():
+                return self.send_operation(request, error="Image not found")
+        else:
+            fingerprint = self.images.get(source.get("alias"))
+            if not fingerprint:
+                return self.send_operation(
+                    request, error="The requested image couldn't be found")
+
+        if name in self.instances:
+            return self.send_operation(
+                request, error="Instance already exists")
+
+        with self._lock:
+            self.add_instance(name, status="Stopped")
+            self.instances[name]["config"].update(body.get("config", {}))
+            self.instances[name]["config"]["volatile.base_image"] = fingerprint
+            self.created_from[name] = source
+        self.send_operation(request)
+
+
+class FakeVBoxManage:
+    """
+    Point yurt's vbox module at testing/fake_vboxmanage.py.
+    - vms: Dict[str, Dict[str, str]]
+        showvminfo values by VM name. UUID, VMState, memory and cpus are
+        filled in if missing.
+    """
+
+    _SCRIPT = os.path.join(os.path.dirname(__file__), "fake_vboxmanage.py")
+
+    def __init__(self, vms=None, hostonlyifs=0):
+        self.vms = {
+            name: dict({"UUID": f"{i:08d}-0000-0000-0000-000000000000",
+                        "VMState": "poweroff", "memory": "2048", "cpus": "2"}, **values)
+            for i, (name, values) in enumerate((vms or {}).items())
+        }
+        self.hostonlyifs = hostonlyifs
+
+    def __enter__(self):
+        import stat
+        import sys
+        from unittest import mock
+        from yurt.vm import vbox
+
+        self._dir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self._dir, "state.json")
+        with open(self.state_file, "w") as f:
+            json.dump({"vms": self.vms, "hostonlyifs": self.hostonlyifs, "calls": []}, f)
+
+        self.executable = os.path.join(self._dir, "VBoxManage")
+        with open(self.executable, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{self._SCRIPT}" "$@"\n')
+        os.chmod(self.executable, os.stat(self.executable).st_mode | stat.S_IXUSR)
+
+        self._env = mock.patch.dict(os.environ, {
+            "YURT_VBOXMANAGE": self.executable,
+            "FAKE_VBOXMANAGE_STATE": self.state_file,
+        })
+        self._env.start()
+        vbox._executable["path"] = None
+        vbox.invalidate_snapshots()
+        return self
+
+    def __exit__(self, *args):
+        from yurt.vm import vbox
+
+        self._env.stop()
+        vbox._executable["path"] = None
+        vbox.invalidate_snapshots()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    @property
+    def state(self):
+        with open(self.state_file) as f:
+            return json.load(f)
+
+    @property
+    def calls(self):
+        return self.state["calls"]
@@ -0,0 +1,141 @@
+import logging
+import os
+import stat
+import threading
+import unittest
+from unittest import mock
+
+from testing.fixtures import temporary_config
+from yurt import agent, config, vm
+from yurt.exceptions import AgentException, LXCException
+
+
+def where():
+    return threading.current_thread().name
+
+
+def fail():
+    logging.info("About to fail.")
+    raise LXCException("Instance c1 not found.")
+
+
+def crash():
+    raise RuntimeError("boom")
+
+
+COMMANDS = {
+    "test.where": ("testing.test_agent", "where"),
+    "test.fail": ("testing.test_agent", "fail"),
+    "test.crash": ("testing.test_agent", "crash"),
+}
+
+
+@unittest.skipIf(config.system == config.System.windows, "Uses a Unix socket.")
+class AgentTest(unittest.TestCase):
+
+    def setUp(self):
+        config_dir = temporary_config()
+        config_dir.__enter__()
+        self.addCleanup(config_dir.__exit__, None, None, None)
+
+        commands = mock.patch.dict(agent._COMMANDS, COMMANDS)
+        commands.start()
+        self.addCleanup(commands.stop)
+
+        # run() forwards every log level.
+        level = logging.getLogger().level
+        self.addCleanup(logging.getLogger().setLevel, level)
+
+        agent.close()
+        self.addCleanup(agent.close)
+
+    def start_agent(self):
+        thread = threading.Thread(target=agent.run, name="agent")
+        thread.start()
+        for _ in range(100):
+            if agent.is_running():
+                break
+            thread.join(0.01)
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(agent.stop)
+        return thread
+
+    def test_fallback_without_agent(self):
+        self.assertEqual(agent.call("test.where"), threading.current_thread().name)
+        self.assertFalse(agent.is_running())
+        self.assertFalse(agent.vm_is_running())
+
+    def test_call(self):
+        self.start_agent()
+
+        self.assertTrue(agent.is_running())
+        self.assertTrue(agent.call("test.where").startswith("Thread-"))
+
+        with self.assertLogs(level="INFO") as logs:
+            with self.assertRaises(LXCException) as e:
+                agent.call("test.fail")
+        self.assertEqual(e.exception.message, "Instance c1 not found.")
+        self.assertIn("INFO:root:About to fail.", logs.output)
+
+        with self.assertRaises(AgentException):
+            agent.call("test.crash")
+        with self.assertRaises(AgentException):
+            agent.call("test.unknown")
+
+    def test_one_connection_per_command(self):
+        self.start_agent()
+
+        with mock.patch.object(agent, "_connect", wraps=agent._connect) as connect, \
+                mock.patch.object(vm, "state", return_value=vm.State.Running):
+            self.assertTrue(agent.vm_is_running())
+            agent.call("test.where")
+            agent.call("test.where")
+
+        self.assertEqual(connect.call_count, 1)
+
+    def test_stop(self):
+        thread = self.start_agent()
+        agent.call("test.where")
+
+        agent.stop()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(agent.is_running())
+        # The command's connection is gone with the agent.
+        with self.assertRaises(AgentException):
+            agent.call("test.where")
+        self.assertEqual(agent.call("test.where"), threading.current_thread().name)
+
+    def test_stale_socket(self):
+        agent._get_authkey(create=True)
+        with open(config.agent_address, "w"):
+            pass
+
+        self.assertEqual(agent.call("test.where"), threading.current_thread().name)
+        self.assertFalse(agent.vm_is_running())
+
+        # A new agent replaces the socket.
+        self.start_agent()
+        self.assertTrue(agent.is_running())
+
+    def test_wrong_authkey(self):
+        self.start_agent()
+        authkey = agent._get_authkey()
+        with open(config.agent_key_file, "wb") as f:
+            f.write(b"stale key")
+
+        self.assertFalse(agent.is_running())
+        self.assertEqual(agent.call("test.where"), threading.current_thread().name)
+
+        with open(config.agent_key_file, "wb") as f:
+            f.write(authkey)
+
+    def test_authkey(self):
+        self.assertIsNone(agent._get_authkey())
+
+        authkey = agent._get_authkey(create=True)
+
+        self.assertEqual(len(authkey), 32)
+        self.assertEqual(agent._get_authkey(), authkey)
+        self.assertEqual(stat.S_IMODE(os.stat(config.agent_key_file).st_mode), 0o600)
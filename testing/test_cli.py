@@ -0,0 +1,73 @@
+import logging
+import unittest
+from unittest import mock
+
+from click.testing import CliRunner
+
+from yurt import cli
+
+
+class CliTest(unittest.TestCase):
+
+    def setUp(self):
+        # main() replaces the root logger's handlers.
+        handlers = logging.getLogger().handlers[:]
+        level = logging.getLogger().level
+        self.addCleanup(setattr, logging.getLogger(), "handlers", handlers)
+        self.addCleanup(logging.getLogger().setLevel, level)
+
+    def invoke(self, *args):
+        return CliRunner().invoke(cli.main, list(args))
+
+    def test_parallel_must_be_positive(self):
+        with mock.patch.object(cli, "_ensure_vm_is_ready") as ensure_vm_is_ready:
+            for command in ["start", "stop", "delete"]:
+                for value in ["0", "-1"]:
+                    result = self.invoke(command, "c1", "-p", value)
+                    self.assertEqual(result.exit_code, 2)
+                    self.assertIn("Invalid value for '-p' / '--parallel'", result.output)
+
+        ensure_vm_is_ready.assert_not_called()
+
+    def launch(self, *args):
+        with mock.patch.object(cli, "_ensure_vm_is_ready"), \
+                mock.patch("yurt.lxc.resolve_image", return_value={"fingerprint": "f"}), \
+                mock.patch("yurt.lxc.launch_many", return_value=[]) as launch_many:
+            result = self.invoke("launch", "alpine/3.11", *args)
+        return result, launch_many
+
+    def test_launch_several(self):
+        result, launch_many = self.launch("web1", "web2", "-p", "2")
+
+        self.assertEqual(result.exit_code, 0)
+        launch_many.assert_called_once_with(
+            "images", "alpine/3.11", ["web1", "web2"], max_workers=2,
+            source={"fingerprint": "f"})
+
+    def test_launch_count(self):
+        result, launch_many = self.launch("web", "-c", "3")
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(launch_many.call_args[0][2], ["web-1", "web-2", "web-3"])
+
+    def test_invalid_count(self):
+        for args in [["web", "-c", "0"], ["web", "-c", "-2"], ["web1", "web2", "-c", "2"]]:
+            result, launch_many = self.launch(*args)
+            self.assertEqual(result.exit_code, 2)
+            launch_many.assert_not_called()
+
+    def test_background_fill_does_not_prompt(self):
+        with mock.patch.object(cli.vm, "state", return_value=cli.vm.State.Stopped), \
+                mock.patch.object(cli, "_ensure_vm_is_ready") as ensure_vm_is_ready, \
+                mock.patch("yurt.lxc.pool.fill") as fill:
+            result = self.invoke("pool", "fill", "--background", "alpine/3.11")
+
+        self.assertEqual(result.exit_code, 0)
+        ensure_vm_is_ready.assert_not_called()
+        fill.assert_not_called()
+
+    def test_images_pull_help(self):
+        result = self.invoke("images", "pull", "-h")
+
+        self.assertIn("Maximum number of images to pull at a time.", result.output)
+        self.assertEqual(self.invoke("images", "pull", "alpine/3.11", "-p", "0").exit_code, 2)
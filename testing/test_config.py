@@ -0,0 +1,107 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+from testing.fixtures import temporary_config
+from yurt import config
+from yurt.exceptions import ConfigWriteException
+
+
+class ConfigTest(unittest.TestCase):
+
+    def test_reads_are_cached(self):
+        with temporary_config(lxd_port=8443):
+            with mock.patch("json.load", wraps=json.load) as load:
+                for _ in range(10):
+                    self.assertEqual(config.get_config(config.Key.lxd_port), 8443)
+            self.assertEqual(load.call_count, 1)
+
+    def test_external_changes_are_seen(self):
+        with temporary_config(lxd_port=8443):
+            self.assertEqual(config.get_config(config.Key.lxd_port), 8443)
+            with open(config._config_file, "w") as f:
+                json.dump({"lxd_port": 18443}, f)
+            os.utime(config._config_file, ns=(0, 0))
+
+            self.assertEqual(config.get_config(config.Key.lxd_port), 18443)
+
+    def test_cached_values_are_copies(self):
+        with temporary_config(warm_pools={"alpine/3.11": 1}):
+            config.get_config(config.Key.warm_pools)["alpine/3.11"] = 5
+            self.assertEqual(
+                config.get_config(config.Key.warm_pools), {"alpine/3.11": 1})
+
+    def test_failed_write_keeps_old_config(self):
+        with temporary_config(lxd_port=8443) as config_dir:
+            with mock.patch("json.dump", side_effect=OSError("disk full")):
+                with self.assertRaises(ConfigWriteException):
+                    config.set_config(config.Key.lxd_port, 18443)
+
+            self.assertEqual(sorted(os.listdir(config_dir)), ["config.json", "config.lock"])
+            with open(config._config_file) as f:
+                self.assertEqual(json.load(f), {"lxd_port": 8443})
+            self.assertEqual(config.get_config(config.Key.lxd_port), 8443)
+
+    def test_write_retries_sharing_violations(self):
+        replace = os.replace
+        failures = [PermissionError("in use"), PermissionError("in use")]
+
+        def flaky_replace(*args):
+            if failures:
+                raise failures.pop()
+            return replace(*args)
+
+        with temporary_config(), mock.patch.object(config, "_SHARING_RETRY_WAIT", 0):
+            with mock.patch("os.replace", side_effect=flaky_replace):
+                config.set_config(config.Key.lxd_port, 18443)
+            self.assertEqual(config.get_config(config.Key.lxd_port), 18443)
+
+            with mock.patch("os.replace", side_effect=PermissionError("in use")) as always:
+                with self.assertRaises(ConfigWriteException):
+                    config.set_config(config.Key.lxd_port, 8443)
+            self.assertEqual(always.call_count, config._SHARING_RETRIES)
+            self.assertEqual(config.get_config(config.Key.lxd_port), 18443)
+
+    def test_write(self):
+        with temporary_config() as config_dir:
+            config.set_config(config.Key.lxd_port, 18443)
+            config.set_config(config.Key.ssh_port, 2222)
+
+            self.assertEqual(sorted(os.listdir(config_dir)), ["config.json", "config.lock"])
+            with open(config._config_file) as f:
+                self.assertEqual(json.load(f), {"lxd_port": 18443, "ssh_port": 2222})
+
+    def test_set_many_writes_once(self):
+        with temporary_config(vm_name="yurt-test"):
+            with mock.patch.object(config, "_write_config", wraps=config._write_config) as write:
+                config.set_many({
+                    config.Key.interface: "vboxnet0",
+                    config.Key.interface_ip_address: "192.168.56.1",
+                    config.Key.interface_netmask: "255.255.255.0",
+                })
+
+            self.assertEqual(write.call_count, 1)
+            self.assertEqual(config.get_config(config.Key.vm_name), "yurt-test")
+            self.assertEqual(config.get_config(config.Key.interface), "vboxnet0")
+            self.assertEqual(config.get_config(config.Key.interface_netmask), "255.255.255.0")
+
+    def test_transaction(self):
+        with temporary_config(lxd_port=8443):
+            with config.transaction() as updates:
+                updates[config.Key.ssh_port] = 2222
+                updates[config.Key.lxd_port] = 18443
+                self.assertEqual(config.get_config(config.Key.lxd_port), 8443)
+
+            self.assertEqual(config.get_config(config.Key.ssh_port), 2222)
+            self.assertEqual(config.get_config(config.Key.lxd_port), 18443)
+
+    def test_transaction_rollback(self):
+        with temporary_config(lxd_port=8443):
+            with self.assertRaises(RuntimeError):
+                with config.transaction() as updates:
+                    updates[config.Key.ssh_port] = 2222
+                    raise RuntimeError("port forwarding failed")
+
+            self.assertIsNone(config.get_config(config.Key.ssh_port))
+            self.assertEqual(config.get_config(config.Key.lxd_port), 8443)
@@ -0,0 +1,273 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from testing.fixtures import FixtureServer
+from yurt import util
+from yurt.exceptions import YurtException
+
+
+class FlakyFileServer(FixtureServer):
+    """
+    Serves `data` with Range support. The first `drops` responses are cut
+    off after `drop_after` bytes.
+    """
+
+    def __init__(self, data: bytes, drops=0, drop_after=0, ranges=True,
+                 head_status=200, honor_ranges=True, failing_range=None, delay=0):
+        super().__init__()
+        self.data = data
+        self.drops = drops
+        self.drop_after = drop_after
+        self.ranges = ranges
+        self.head_status = head_status
+        self.honor_ranges = honor_ranges
+        self.failing_range = failing_range
+        self.delay = delay
+        self.range_headers = []
+        self._lock = threading.Lock()
+
+    def handle(self, request):
+        range_header = request.headers.get("Range")
+        with self._lock:
+            self.request_count += 1
+            if request.command != "HEAD":
+                self.range_headers.append(range_header)
+            drop = self.drops > 0 and request.command != "HEAD"
+            if drop:
+                self.drops -= 1
+
+        if request.command == "HEAD":
+            request.send_response(self.head_status)
+            request.send_header("Content-Length", str(len(self.data)))
+            if self.ranges:
+                request.send_header("Accept-Ranges", "bytes")
+            request.end_headers()
+            return
+
+        if range_header and range_header == self.failing_range:
+            request.send_response(500)
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        start, end = 0, len(self.data) - 1
+        if range_header and self.ranges and self.honor_ranges:
+            start, _, last = range_header[len("bytes="):].partition("-")
+            start, end = int(start), int(last or end)
+            if start >= len(self.data):
+                request.send_response(416)
+                request.send_header("Content-Range", f"bytes */{len(self.data)}")
+                request.end_headers()
+                return
+            request.send_response(206)
+            request.send_header(
+                "Content-Range", f"bytes {start}-{end}/{len(self.data)}")
+        else:
+            request.send_response(200)
+
+        body = self.data[start:end + 1]
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+
+        if drop:
+            body = body[:self.drop_after]
+            request.close_connection = True
+        if not self.delay:
+            request.wfile.write(body)
+            return
+
+        # Trickle the body out so that the download takes a while.
+        try:
+            for i in range(0, len(body), 64 * 1024):
+                request.wfile.write(body[i:i + 64 * 1024])
+                time.sleep(self.delay)
+        except OSError:
+            pass
+
+
+class DownloadTest(unittest.TestCase):
+
+    DATA = os.urandom(3 * 1024 * 1024 + 123)
+    SHA256 = hashlib.sha256(DATA).hexdigest()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.destination = os.path.join(self.tmp_dir, "image.ova")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read_destination(self):
+        with open(self.destination, "rb") as f:
+            return f.read()
+
+    def test_download(self):
+        with FlakyFileServer(self.DATA) as server:
+            digest = util.download_file(server.url, self.destination, sha256=self.SHA256)
+
+        self.assertEqual(digest, self.SHA256)
+        self.assertEqual(self.read_destination(), self.DATA)
+        self.assertFalse(os.path.exists(f"{self.destination}.part"))
+
+    def test_resume_after_dropped_connections(self):
+        with FlakyFileServer(self.DATA, drops=2, drop_after=1024 * 1024) as server:
+            digest = util.download_file(
+                server.url, self.destination, sha256=self.SHA256, retry_wait=0)
+
+        self.assertEqual(digest, self.SHA256)
+        self.assertEqual(self.read_destination(), self.DATA)
+        self.assertEqual(server.range_headers, [
+            None, "bytes=1048576-", "bytes=2097152-"])
+
+    def test_resume_part_file_from_previous_run(self):
+        with FlakyFileServer(self.DATA, drops=1, drop_after=1024 * 1024) as server:
+            with self.assertRaises(YurtException):
+                util.download_file(server.url, self.destination, retries=0)
+            self.assertEqual(os.path.getsize(f"{self.destination}.part"), 1024 * 1024)
+
+            digest = util.download_file(server.url, self.destination)
+
+        self.assertEqual(digest, self.SHA256)
+        self.assertEqual(server.range_headers[-1], "bytes=1048576-")
+
+    def test_restart_without_range_support(self):
+        with FlakyFileServer(self.DATA, drops=1, drop_after=1000, ranges=False) as server:
+            util.download_file(server.url, self.destination, retry_wait=0)
+
+        self.assertEqual(self.read_destination(), self.DATA)
+
+    def test_checksum_mismatch(self):
+        with FlakyFileServer(self.DATA) as server:
+            with self.assertRaises(YurtException):
+                util.download_file(server.url, self.destination, sha256="0" * 64)
+
+        self.assertFalse(os.path.exists(self.destination))
+        self.assertFalse(os.path.exists(f"{self.destination}.part"))
+
+    def test_segmented_download(self):
+        with FlakyFileServer(self.DATA, drops=2, drop_after=1000) as server:
+            digest = util.download_file(
+                server.url, self.destination, sha256=self.SHA256, connections=3, retry_wait=0)
+
+        self.assertEqual(digest, self.SHA256)
+        self.assertEqual(self.read_destination(), self.DATA)
+        self.assertFalse(os.path.exists(f"{self.destination}.part"))
+        self.assertLessEqual(
+            {"bytes=0-1048616", "bytes=1048617-2097233", "bytes=2097234-3145850"},
+            set(server.range_headers))
+        self.assertEqual(len(server.range_headers), 5)
+
+    def test_segmented_download_without_range_support(self):
+        with FlakyFileServer(self.DATA, ranges=False) as server:
+            util.download_file(server.url, self.destination, connections=3)
+
+        self.assertEqual(self.read_destination(), self.DATA)
+        self.assertEqual(server.range_headers, [None])
+
+    def test_segmented_download_when_head_is_rejected(self):
+        with FlakyFileServer(self.DATA, head_status=405) as server:
+            util.download_file(server.url, self.destination, connections=3)
+
+        self.assertEqual(self.read_destination(), self.DATA)
+        self.assertEqual(server.range_headers, [None])
+
+    def test_segmented_download_when_ranges_are_ignored(self):
+        with FlakyFileServer(self.DATA, honor_ranges=False) as server:
+            digest = util.download_file(
+                server.url, self.destination, sha256=self.SHA256, connections=3)
+
+        self.assertEqual(digest, self.SHA256)
+        self.assertEqual(self.read_destination(), self.DATA)
+        self.assertEqual(server.range_headers[-1], None)
+
+    def test_failed_segment_stops_the_others(self):
+        with FlakyFileServer(self.DATA, failing_range="bytes=0-1048616", delay=0.1) as server:
+            start = time.monotonic()
+            with self.assertRaises(YurtException):
+                util.download_file(server.url, self.destination, connections=3)
+            elapsed = time.monotonic() - start
+
+        # The other segments would take 1.6 s to finish.
+        self.assertLess(elapsed, 1)
+        self.assertFalse(os.path.exists(f"{self.destination}.part"))
+
+    def test_killed_segmented_download(self):
+        # A killed segmented download leaves a full size, partly empty file.
+        with open(f"{self.destination}.segments", "wb") as f:
+            f.truncate(len(self.DATA))
+
+        with FlakyFileServer(self.DATA) as server:
+            digest = util.download_file(
+                server.url, self.destination, sha256=self.SHA256, connections=3)
+
+        self.assertEqual(digest, self.SHA256)
+        self.assertFalse(os.path.exists(f"{self.destination}.segments"))
+
+    def test_complete_part_file(self):
+        with open(f"{self.destination}.part", "wb") as f:
+            f.write(self.DATA)
+
+        with FlakyFileServer(self.DATA) as server:
+            digest = util.download_file(server.url, self.destination, sha256=self.SHA256)
+
+        self.assertEqual(digest, self.SHA256)
+        self.assertEqual(server.range_headers, [f"bytes={len(self.DATA)}-"])
+
+    def test_part_file_longer_than_remote_file(self):
+        with open(f"{self.destination}.part", "wb") as f:
+            f.write(self.DATA + b"stale")
+
+        with FlakyFileServer(self.DATA) as server:
+            digest = util.download_file(server.url, self.destination, sha256=self.SHA256)
+
+        self.assertEqual(digest, self.SHA256)
+        self.assertEqual(server.range_headers, [f"bytes={len(self.DATA) + 5}-", None])
+
+
+class HashRecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.tmp_dir, "image.ova")
+        with open(self.file, "wb") as f:
+            f.write(b"yurt" * 1000)
+        self.sha256 = hashlib.sha256(b"yurt" * 1000).hexdigest()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_recorded_hash_is_trusted(self):
+        self.assertTrue(util.is_sha256(self.file, self.sha256))
+
+        with mock.patch.object(util, "_hash_file") as hash_file:
+            self.assertTrue(util.is_sha256(self.file, self.sha256))
+            self.assertFalse(util.is_sha256(self.file, "0" * 64))
+        hash_file.assert_not_called()
+
+    def test_changed_file_is_rehashed(self):
+        util.record_sha256(self.file, self.sha256)
+        with open(self.file, "ab") as f:
+            f.write(b"!")
+
+        self.assertFalse(util.is_sha256(self.file, self.sha256))
+
+    def test_verify_ignores_record(self):
+        util.record_sha256(self.file, "0" * 64)
+
+        self.assertFalse(util.is_sha256(self.file, self.sha256))
+        self.assertTrue(util.is_sha256(self.file, self.sha256, trust_record=False))
+
+    def test_download_records_hash(self):
+        destination = os.path.join(self.tmp_dir, "download.ova")
+        with FlakyFileServer(b"data") as server:
+            digest = util.download_file(server.url, destination)
+
+        with mock.patch.object(util, "_hash_file") as hash_file:
+            self.assertTrue(util.is_sha256(destination, digest))
+        hash_file.assert_not_called()
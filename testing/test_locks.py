@@ -0,0 +1,100 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from testing.fixtures import temporary_config
+from yurt import config, util, vm
+from yurt.vm import util as vm_util
+
+
+INCREMENT = """
+from yurt import config
+for _ in range({count}):
+    with config.transaction() as updates:
+        updates[config.Key.lxd_port] = (config.get_config(config.Key.lxd_port) or 0) + 1
+"""
+
+HOLD_LOCK = """
+import sys, time
+from yurt import util
+with util.file_lock(sys.argv[1]):
+    print("locked", flush=True)
+    time.sleep(0.5)
+"""
+
+
+@unittest.skipIf(config.system == config.System.windows, "Uses $HOME for the config directory.")
+class FileLockTest(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.env = dict(os.environ, HOME=self.home, YURT_ENV="")
+
+    def tearDown(self):
+        shutil.rmtree(self.home)
+
+    def python(self, code, *args):
+        return subprocess.Popen(
+            [sys.executable, "-c", code, *args], env=self.env,
+            stdout=subprocess.PIPE, universal_newlines=True)
+
+    def test_concurrent_transactions(self):
+        processes = [self.python(INCREMENT.format(count=25)) for _ in range(4)]
+        for p in processes:
+            p.communicate()
+
+        result = subprocess.run(
+            [sys.executable, "-c",
+             "from yurt import config; print(config.get_config(config.Key.lxd_port))"],
+            env=self.env, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        self.assertEqual(result.stdout.strip(), "100")
+
+    def test_lock_waits_for_other_process(self):
+        path = os.path.join(self.home, "test.lock")
+        holder = self.python(HOLD_LOCK, path)
+        self.assertEqual(holder.stdout.readline().strip(), "locked")
+
+        start = time.monotonic()
+        with self.assertLogs(level="INFO") as logs, \
+                util.file_lock(path, wait_message="Waiting..."):
+            waited = time.monotonic() - start
+        holder.communicate()
+
+        self.assertGreater(waited, 0.2)
+        self.assertEqual(logs.output, ["INFO:root:Waiting..."])
+
+    def test_lock_is_reentrant(self):
+        path = os.path.join(self.home, "test.lock")
+        with util.file_lock(path):
+            with util.file_lock(path):
+                pass
+            self.assertEqual(util._file_locks[path]["depth"], 1)
+        self.assertIsNone(util._file_locks[path]["file"])
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def test_concurrent_ensure_is_ready_starts_once(self):
+        ready = threading.Event()
+
+        def start_vm(*args):
+            time.sleep(0.2)
+            ready.set()
+
+        with temporary_config(), \
+                mock.patch.object(vm_util, "is_ready_fast", side_effect=ready.is_set), \
+                mock.patch.object(vm.vm, "_ensure_is_ready", side_effect=start_vm) as ensure, \
+                mock.patch.object(vm.vm, "invalidate_state"):
+            threads = [threading.Thread(target=vm.ensure_is_ready) for _ in range(5)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(ensure.call_count, 1)
@@ -0,0 +1,151 @@
+import time
+import unittest
+from unittest import mock
+
+from testing.fixtures import FakeLXD, temporary_config
+from yurt import lxc
+from yurt.exceptions import LXCException
+from yurt.lxc import catalog
+from yurt.lxc import util as lxc_util
+
+
+def cache_catalog(images):
+    catalog._save("images", {
+        "version": catalog._CACHE_VERSION,
+        "fetched_at": time.time(),
+        "index": {"paths": ["images.json"]},
+        "catalogs": {"images.json": {"images": images}},
+    })
+
+
+class BulkOperationsTest(unittest.TestCase):
+
+    def setUp(self):
+        lxc_util.reset_pylxd_client()
+        catalog._indexes.clear()
+
+    def remote(self, fake_lxd):
+        """
+        Point the 'images' remote at a URL with no catalog.
+        """
+        return mock.patch.dict(lxc_util.REMOTES, {"images": {
+            "Name": "images", "URL": f"{fake_lxd.url}/simplestreams"}})
+
+    def test_stop_collects_results(self):
+        with FakeLXD() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            for i in range(10):
+                fake_lxd.add_instance(f"c{i}")
+            fake_lxd.add_instance("stopped", status="Stopped")
+
+            names = [f"c{i}" for i in range(10)] + ["stopped", "missing"]
+            results = lxc.stop(names, max_workers=4)
+
+        self.assertEqual([r["Name"] for r in results], names)
+        self.assertTrue(all(r["Status"] == "OK" for r in results[:10]))
+        self.assertEqual(results[10]["Status"], "Failed")
+        self.assertIn("already stopped", results[10]["Error"])
+        self.assertEqual(results[11]["Error"], "Instance not found.")
+        self.assertTrue(all(
+            i["status"] == "Stopped" for i in fake_lxd.instances.values()))
+
+    def test_delete_continues_after_failure(self):
+        with FakeLXD() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            fake_lxd.add_instance("running")
+            fake_lxd.add_instance("stopped", status="Stopped")
+
+            results = lxc.delete(["running", "stopped"])
+
+        self.assertEqual(results[0]["Status"], "Failed")
+        self.assertEqual(results[1]["Status"], "OK")
+        self.assertEqual(list(fake_lxd.instances), ["running"])
+
+    def test_launch_pulls_image_once(self):
+        with FakeLXD(operation_waits=2) as fake_lxd, \
+                temporary_config(lxd_port=fake_lxd.port), self.remote(fake_lxd):
+            fake_lxd.images["alpine/3.11"] = "abc123"
+
+            names = [f"web-{i}" for i in range(1, 6)]
+            results = lxc.launch_many("images", "alpine/3.11", names)
+
+        self.assertTrue(all(r["Status"] == "OK" for r in results))
+        self.assertTrue(all(
+            fake_lxd.instances[n]["status"] == "Running" for n in names))
+        self.assertEqual(fake_lxd.created_from["web-1"]["alias"], "alpine/3.11")
+        for name in names[1:]:
+            self.assertEqual(fake_lxd.created_from[name], {
+                "type": "image", "fingerprint": "abc123"})
+
+    def test_launch_reports_failed_operation(self):
+        with FakeLXD() as fake_lxd, temporary_config(lxd_port=fake_lxd.port), \
+                self.remote(fake_lxd):
+            with self.assertRaises(LXCException):
+                lxc.launch("images", "alpine/9.99", "c1")
+
+    def test_launch_pulls_by_fingerprint(self):
+        with FakeLXD() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            fake_lxd.images["alpine/3.11"] = "abc123"
+            cache_catalog([{"alias": "alpine/3.11", "aliases": ["alpine/3.11"],
+                            "description": "", "fingerprint": "abc123"}])
+
+            lxc.launch("images", "alpine/3.11", "c1")
+
+        self.assertEqual(fake_lxd.created_from["c1"]["fingerprint"], "abc123")
+        self.assertNotIn("alias", fake_lxd.created_from["c1"])
+
+    def test_launch_unknown_alias_makes_no_requests(self):
+        with FakeLXD() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            cache_catalog([{"alias": "alpine/3.11", "aliases": ["alpine/3.11"],
+                            "description": "", "fingerprint": "abc123"}])
+
+            with self.assertRaises(LXCException) as e:
+                lxc.launch("images", "alpine/3.1", "c1")
+
+        self.assertIn("Did you mean alpine/3.11?", e.exception.message)
+        self.assertEqual(fake_lxd.request_count, 0)
+
+    def test_pull_images(self):
+        with FakeLXD() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            fake_lxd.images.update({"alpine/3.11": "abc123", "debian/10": "def456"})
+            fake_lxd.image_store.add("def456")
+            cache_catalog([
+                {"alias": alias, "aliases": [alias], "description": "", "fingerprint": fingerprint}
+                for alias, fingerprint in fake_lxd.images.items()
+            ])
+
+            with mock.patch.object(
+                    catalog, "get_alias_index", wraps=catalog.get_alias_index) as get_alias_index:
+                results = lxc.pull_images(
+                    "images", ["alpine/3.11", "debian/10", "fedora/33"], auto_update=True)
+
+        self.assertEqual(get_alias_index.call_count, 1)
+
+        self.assertEqual([r["Status"] for r in results], ["OK", "OK", "Failed"])
+        self.assertIn("not found", results[2]["Error"])
+        self.assertEqual(list(fake_lxd.pulled), ["alpine/3.11"])
+        self.assertTrue(fake_lxd.pulled["alpine/3.11"]["auto_update"])
+        self.assertEqual(fake_lxd.image_store, {"abc123", "def456"})
+
+    def test_not_found_errors_name_the_noun(self):
+        from pylxd.exceptions import NotFound
+
+        def action(name):
+            raise NotFound(mock.Mock())
+
+        results = lxc.lxc._for_each_instance(["alpine/3.11"], action, 1, noun="Image")
+        self.assertEqual(results[0]["Error"], "Image not found.")
+
+    def test_clone(self):
+        with FakeLXD() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            fake_lxd.add_instance("base", status="Stopped")
+            fake_lxd.add_instance("dev-2")
+
+            results = lxc.clone("base", ["dev-1", "dev-2"])
+
+            with self.assertRaises(LXCException):
+                lxc.clone("missing", ["dev-3"])
+
+        self.assertEqual([r["Status"] for r in results], ["OK", "Failed"])
+        self.assertEqual(fake_lxd.instances["dev-1"]["status"], "Running")
+        self.assertEqual(fake_lxd.created_from["dev-1"], {
+            "type": "copy", "source": "base", "instance_only": True})
+        self.assertNotIn("dev-3", fake_lxd.instances)
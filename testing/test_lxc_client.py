@@ -0,0 +1,82 @@
+import unittest
+from unittest import mock
+
+import requests
+
+from testing.fixtures import FakeLXD, temporary_config
+from yurt import config
+from yurt.exceptions import LXCException
+from yurt.lxc import util as lxc_util
+
+
+class ClientCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        lxc_util.reset_pylxd_client()
+        self.addCleanup(lxc_util.reset_pylxd_client)
+
+    def test_client_is_shared(self):
+        with FakeLXD() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            client = lxc_util.get_pylxd_client()
+            self.assertIs(lxc_util.get_pylxd_client(), client)
+            self.assertIs(client.api.session, lxc_util._get_session(lxc_util._endpoint()))
+
+        # pylxd fetches host info once, when the client is built.
+        self.assertEqual(fake_lxd.request_count, 1)
+
+    def test_new_client_for_new_endpoint(self):
+        with FakeLXD() as first, FakeLXD() as second, temporary_config(lxd_port=first.port):
+            client = lxc_util.get_pylxd_client()
+            config.set_config(config.Key.lxd_port, second.port)
+
+            self.assertIsNot(lxc_util.get_pylxd_client(), client)
+            self.assertEqual(second.request_count, 1)
+
+    def test_api_request_does_not_build_a_client(self):
+        with FakeLXD() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            fake_lxd.add_instance("c1")
+            lxc_util.api_request("GET", "/instances")
+            lxc_util.api_request("GET", "/instances/c1")
+
+        self.assertEqual(lxc_util._clients, {})
+        self.assertEqual(len(lxc_util._sessions), 1)
+
+    def test_unreachable_lxd(self):
+        with FakeLXD() as fake_lxd:
+            port = fake_lxd.port
+
+        with temporary_config(lxd_port=port):
+            with self.assertRaises(LXCException):
+                lxc_util.get_pylxd_client()
+
+
+class ReconnectTest(unittest.TestCase):
+
+    def setUp(self):
+        lxc_util._sessions["stale"] = mock.Mock()
+
+    def tearDown(self):
+        lxc_util.reset_pylxd_client()
+
+    def test_retry_on_fresh_connection(self):
+        stale = lxc_util._sessions["stale"]
+        fn = mock.Mock(side_effect=[requests.ConnectionError("reset"), "result"])
+
+        self.assertEqual(lxc_util.reconnect_on_failure(fn)("c1"), "result")
+        self.assertEqual(fn.call_args_list, [mock.call("c1"), mock.call("c1")])
+        stale.close.assert_called_once_with()
+        self.assertEqual(lxc_util._sessions, {})
+
+    def test_gives_up_after_one_retry(self):
+        fn = mock.Mock(side_effect=requests.ConnectionError("refused"))
+
+        with self.assertRaises(LXCException):
+            lxc_util.reconnect_on_failure(fn)()
+        self.assertEqual(fn.call_count, 2)
+
+    def test_other_errors_are_not_retried(self):
+        fn = mock.Mock(side_effect=LXCException("Instance c1 not found."))
+
+        with self.assertRaises(LXCException):
+            lxc_util.reconnect_on_failure(fn)()
+        fn.assert_called_once_with()
@@ -0,0 +1,43 @@
+import unittest
+
+from testing.fixtures import FakeLXD, temporary_config
+from yurt import lxc
+from yurt.lxc import util as lxc_util
+
+
+class ListTest(unittest.TestCase):
+
+    def setUp(self):
+        lxc_util.reset_pylxd_client()
+
+    def list_from(self, fake_lxd):
+        with fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            instances = lxc.list_()
+        return instances, fake_lxd.request_count
+
+    def test_list_uses_single_request(self):
+        fake_lxd = FakeLXD()
+        for i in range(20):
+            fake_lxd.add_instance(f"c{i}", ip_address=f"192.168.1.{i}")
+
+        instances, request_count = self.list_from(fake_lxd)
+
+        self.assertEqual(request_count, 1)
+        self.assertEqual(len(instances), 20)
+        self.assertEqual(instances[3], {
+            "Name": "c3",
+            "Status": "Running",
+            "IP Address": "192.168.1.3",
+            "Image": "Alpine/3.11 (amd64)",
+        })
+
+    def test_list_falls_back_to_state_requests(self):
+        fake_lxd = FakeLXD(include_state=False)
+        fake_lxd.add_instance("c1", ip_address="192.168.1.1")
+        fake_lxd.add_instance("c2", status="Stopped")
+
+        instances, request_count = self.list_from(fake_lxd)
+
+        self.assertEqual(request_count, 3)
+        self.assertEqual(instances[0]["IP Address"], "192.168.1.1")
+        self.assertEqual(instances[1]["Status"], "Stopped")
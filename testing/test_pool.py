@@ -0,0 +1,104 @@
+import unittest
+from unittest import mock
+
+from testing.fixtures import FakeLXD, temporary_config
+from testing.test_lxc_bulk import cache_catalog
+from yurt import lxc
+from yurt.lxc import catalog, pool
+from yurt.lxc import util as lxc_util
+
+
+class WarmPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        lxc_util.reset_pylxd_client()
+        catalog._indexes.clear()
+        patcher = mock.patch.object(pool, "fill_in_background")
+        self.fill_in_background = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_lxd(self):
+        fake_lxd = FakeLXD()
+        fake_lxd.images["alpine/3.11"] = "abc123"
+        return fake_lxd
+
+    def test_fill_and_launch(self):
+        with self.fake_lxd() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            cache_catalog([{"alias": "alpine/3.11", "aliases": ["alpine/3.11"],
+                            "description": "", "fingerprint": "abc123"}])
+            pool.set_size("alpine/3.11", 2)
+            pool.fill()
+
+            members = [n for n, i in fake_lxd.instances.items() if pool.is_pooled(i)]
+            self.assertEqual(len(members), 2)
+            self.assertTrue(all(
+                fake_lxd.instances[n]["status"] == "Stopped" for n in members))
+            self.assertEqual(lxc.list_(), [])
+
+            # Only the config key marks pool members, not the name.
+            fake_lxd.add_instance(f"{pool.POOL_PREFIX}-mine")
+            self.assertEqual([i["Name"] for i in lxc.list_()], [f"{pool.POOL_PREFIX}-mine"])
+            del fake_lxd.instances[f"{pool.POOL_PREFIX}-mine"]
+
+            results = lxc.launch_many("images", "alpine/3.11", ["c1", "c2", "c3"])
+
+            self.assertTrue(all(r["Status"] == "OK" for r in results))
+            self.assertEqual(sorted(r["Name"] for r in lxc.list_()), ["c1", "c2", "c3"])
+            self.assertEqual(pool.status(), [{
+                "Image": "alpine/3.11", "Size": 2, "Ready": 0, "Hits": 2, "Misses": 1}])
+
+        # Claimed containers are renamed pool members, c3 was created.
+        self.assertNotIn("c1", fake_lxd.created_from)
+        self.assertNotIn("c2", fake_lxd.created_from)
+        self.assertIn("c3", fake_lxd.created_from)
+        self.assertEqual(fake_lxd.instances["c1"]["config"][pool.POOL_CONFIG_KEY], "")
+        self.fill_in_background.assert_called_once_with("alpine/3.11")
+
+    def test_fill_shrinks_pool(self):
+        with self.fake_lxd() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            cache_catalog([{"alias": "alpine/3.11", "aliases": ["alpine/3.11"],
+                            "description": "", "fingerprint": "abc123"}])
+            pool.set_size("alpine/3.11", 3)
+            pool.fill()
+            pool.set_size("alpine/3.11", 1)
+            pool.fill(["alpine/3.11"])
+
+            self.assertEqual(pool.status()[0]["Ready"], 1)
+
+    def test_launch_without_pool(self):
+        with self.fake_lxd() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            cache_catalog([{"alias": "alpine/3.11", "aliases": ["alpine/3.11"],
+                            "description": "", "fingerprint": "abc123"}])
+            lxc.launch("images", "alpine/3.11", "c1")
+
+            self.assertEqual(pool.get_stats(), {})
+        self.fill_in_background.assert_not_called()
+
+    def test_claim_stops_on_failure(self):
+        with self.fake_lxd() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            cache_catalog([{"alias": "alpine/3.11", "aliases": ["alpine/3.11"],
+                            "description": "", "fingerprint": "abc123"}])
+            pool.set_size("alpine/3.11", 2)
+            pool.fill()
+            fake_lxd.add_instance("c1")
+
+            self.assertEqual(pool.claim("alpine/3.11", ["c2", "c1", "c3"]), ["c2"])
+
+            # c1 is in use: claiming stops there, without using up the pool
+            # or recording misses.
+            self.assertEqual(pool.status(), [{
+                "Image": "alpine/3.11", "Size": 2, "Ready": 1, "Hits": 1, "Misses": 0}])
+
+    def test_claimed_containers_start_when_create_fails(self):
+        with self.fake_lxd() as fake_lxd, temporary_config(lxd_port=fake_lxd.port):
+            cache_catalog([{"alias": "alpine/3.11", "aliases": ["alpine/3.11"],
+                            "description": "", "fingerprint": "abc123"}])
+            pool.set_size("alpine/3.11", 1)
+            pool.fill()
+            fake_lxd.images.clear()
+
+            results = lxc.launch_many("images", "alpine/3.11", ["c1", "c2", "c3"])
+
+            self.assertEqual([r["Status"] for r in results], ["OK", "Failed", "Failed"])
+            self.assertIn("Could not create from alpine/3.11", results[1]["Error"])
+            self.assertEqual(fake_lxd.instances["c1"]["status"], "Running")
@@ -0,0 +1,105 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from yurt import config
+from yurt.exceptions import VMException
+from yurt.vm import provision
+
+
+STEPS = [
+    provision.Step("first", "First step", "echo first-output"),
+    provision.Step("second", "Second step", "false\necho unreachable"),
+    provision.Step("third", "Third step", "echo three"),
+]
+
+
+@unittest.skipIf(config.system == config.System.windows, "Runs bash.")
+class ScriptTest(unittest.TestCase):
+
+    def setUp(self):
+        self.markers = tempfile.mkdtemp()
+        patch = mock.patch.object(provision, "MARKERS_DIR", self.markers)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(shutil.rmtree, self.markers)
+
+    def run_script(self, steps):
+        stream = provision._StatusStream(steps)
+        result = subprocess.run(
+            ["bash"], input=provision._script(steps),
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        stream.write(result.stdout)
+        return result, stream
+
+    def test_failed_step_stops_the_script(self):
+        with self.assertLogs(level="INFO") as logs:
+            result, stream = self.run_script(STEPS)
+
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(stream.failed_step, "second")
+        self.assertNotIn("unreachable", result.stdout)
+        self.assertNotIn("three", result.stdout)
+        self.assertEqual(sorted(os.listdir(self.markers)), ["first"])
+        self.assertIn("INFO:root:First step...", logs.output)
+
+    def test_completed_steps_are_skipped(self):
+        self.run_script(STEPS[:1])
+
+        with self.assertLogs(level="INFO") as logs:
+            result, stream = self.run_script([STEPS[0], STEPS[2]])
+
+        self.assertEqual(result.returncode, 0)
+        self.assertIsNone(stream.failed_step)
+        self.assertNotIn("first-output", result.stdout)
+        self.assertIn("INFO:root:First step: already done.", logs.output)
+        self.assertEqual(sorted(os.listdir(self.markers)), ["first", "third"])
+
+    def test_heredoc_is_not_expanded(self):
+        path = os.path.join(self.markers, "file")
+        content = "$HOME `whoami` \"quoted\" 'single'"
+        step = provision.Step("write", "Write", provision.write_file(path, content))
+
+        result, _ = self.run_script([step])
+
+        self.assertEqual(result.returncode, 0)
+        with open(path) as f:
+            self.assertEqual(f.read(), content + "\n")
+
+
+class StatusStreamTest(unittest.TestCase):
+
+    def test_lines_split_across_writes(self):
+        stream = provision._StatusStream(STEPS)
+        output = f"{provision._STATUS_PREFIX} start first\r\nok\n{provision._STATUS_PREFIX} fail second\n"
+
+        with self.assertLogs(level="DEBUG") as logs:
+            for i in range(0, len(output), 5):
+                stream.write(output[i:i + 5])
+
+        self.assertEqual(stream.failed_step, "second")
+        self.assertEqual(logs.output, ["INFO:root:First step...", "DEBUG:root:ok"])
+
+    def test_malformed_status_line(self):
+        stream = provision._StatusStream(STEPS)
+        with self.assertLogs(level="DEBUG") as logs:
+            stream.write(f"{provision._STATUS_PREFIX}\n")
+
+        self.assertIsNone(stream.failed_step)
+        self.assertIn("Unexpected status line", logs.output[0])
+
+    def test_run_reports_failed_step(self):
+        def run_cmd(cmd, out_stream):
+            out_stream.write(f"{provision._STATUS_PREFIX} fail second\n")
+            raise VMException("Command failed")
+
+        with mock.patch("yurt.vm.ssh.put_file") as put_file, \
+                mock.patch("yurt.vm.ssh.run_cmd", run_cmd):
+            with self.assertRaises(VMException) as e:
+                provision.run("lxd", STEPS)
+
+        self.assertEqual(e.exception.message, "Provisioning failed at: Second step")
+        self.assertEqual(put_file.call_args[0][1], f"/tmp/{config.app_name}-provision-lxd.sh")
@@ -0,0 +1,55 @@
+import unittest
+from unittest import mock
+
+from testing.fixtures import FakeLXD, temporary_config
+from yurt import config
+from yurt.lxc import util as lxc_util
+from yurt.vm import util as vm_util
+
+
+class ReadinessFingerprintTest(unittest.TestCase):
+
+    def setUp(self):
+        lxc_util.reset_pylxd_client()
+        self.addCleanup(lxc_util.reset_pylxd_client)
+
+    def ready(self, fake_lxd, change=None):
+        """
+        Record a fingerprint, apply `change` to fake_lxd and check readiness.
+        """
+        config.set_config(config.Key.lxd_port, fake_lxd.port)
+        config.set_config(
+            config.Key.readiness_fingerprint, lxc_util.get_readiness_fingerprint())
+        if change:
+            change(fake_lxd)
+        return vm_util.is_ready_fast()
+
+    def test_match(self):
+        with FakeLXD() as fake_lxd, temporary_config():
+            self.assertTrue(self.ready(fake_lxd))
+            self.assertTrue(self.ready(fake_lxd))
+            self.assertIsNotNone(config.get_config(config.Key.readiness_fingerprint))
+
+    def test_mismatch(self):
+        changes = {
+            "restarted": lambda lxd: setattr(lxd, "server_pid", 2000),
+            "network deleted": lambda lxd: lxd.networks.clear(),
+            "profile changed": lambda lxd: lxd.profiles.update(yurt="profile-v2"),
+        }
+
+        for description, change in changes.items():
+            with self.subTest(description), FakeLXD() as fake_lxd, temporary_config():
+                self.assertFalse(self.ready(fake_lxd, change))
+                self.assertIsNone(config.get_config(config.Key.readiness_fingerprint))
+
+    def test_unreachable(self):
+        with FakeLXD() as fake_lxd, temporary_config(), \
+                mock.patch("yurt.util.is_http_reachable", return_value=False):
+            self.assertFalse(self.ready(fake_lxd))
+            self.assertIsNone(config.get_config(config.Key.readiness_fingerprint))
+
+    def test_not_recorded(self):
+        with temporary_config(lxd_port=1), \
+                mock.patch("yurt.util.is_http_reachable") as probe:
+            self.assertFalse(vm_util.is_ready_fast())
+            probe.assert_not_called()
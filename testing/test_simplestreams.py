@@ -0,0 +1,221 @@
+import json
+import unittest
+from unittest import mock
+
+from testing.fixtures import FixtureServer, temporary_config
+from yurt import config
+from yurt.exceptions import LXCException
+from yurt.lxc import catalog, simplestreams
+from yurt.lxc import util as lxc_util
+
+
+def product(aliases, arch="amd64", ftype="squashfs", os_="Alpine", release="3.11"):
+    return {
+        "aliases": aliases,
+        "arch": arch,
+        "os": os_,
+        "release": release,
+        "release_title": release,
+        "variant": "default",
+        "versions": {
+            "20201209_13:00": {"items": {}},
+            "20201210_13:00": {
+                "items": {
+                    "lxd.tar.xz": {
+                        "ftype": "lxd.tar.xz",
+                        "size": 832,
+                        "combined_squashfs_sha256": f"{aliases}-fingerprint",
+                    },
+                    "rootfs": {"ftype": ftype, "size": 2650112},
+                }
+            },
+        },
+    }
+
+
+CATALOG = {
+    "content_id": "images",
+    "datatype": "image-downloads",
+    "format": "products:1.0",
+    "products": {
+        "alpine:3.11:amd64:default": product("alpine/3.11/default,alpine/3.11"),
+        "alpine:3.11:arm64:default": product("alpine/3.11", arch="arm64"),
+        "alpine:3.11:amd64:vm": product("alpine/3.11/vm", ftype="disk-kvm.img"),
+        "alpine:edge:amd64:default": product(""),
+        "debian:buster:amd64:default": product(
+            "debian/10,debian/buster", ftype="root.tar.xz", os_="Debian", release="buster"),
+    },
+    "updated": "Thu, 10 Dec 2020 17:36:18 +0000",
+}
+
+INDEX = {
+    "format": "index:1.0",
+    "index": {
+        "images": {
+            "datatype": "image-downloads",
+            "format": "products:1.0",
+            "path": "streams/v1/images.json",
+            "products": list(CATALOG["products"]),
+        }
+    },
+}
+
+
+class SimplestreamsServer(FixtureServer):
+    """
+    Serves INDEX and CATALOG with ETags, honoring If-None-Match.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.not_modified = 0
+
+    def handle(self, request):
+        self.request_count += 1
+        documents = {
+            "/streams/v1/index.json": INDEX,
+            "/streams/v1/images.json": CATALOG,
+        }
+        if request.path not in documents:
+            return self.send_json(request, {}, status=404)
+
+        etag = f'"{request.path}-v1"'
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            request.send_response(304)
+            request.end_headers()
+            return
+
+        self.send_json(request, documents[request.path], headers={"ETag": etag})
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class SimplestreamsTest(unittest.TestCase):
+
+    def test_parse_filters_products(self):
+        images = simplestreams.parse_products([json.dumps(CATALOG)])
+
+        self.assertEqual(
+            [[a["name"] for a in i["aliases"]] for i in images],
+            [["alpine/3.11/default", "alpine/3.11"], ["debian/10", "debian/buster"]]
+        )
+        self.assertEqual(images[0]["fingerprint"], "alpine/3.11/default,alpine/3.11-fingerprint")
+        self.assertEqual(images[0]["architecture"], "x86_64")
+        self.assertEqual(
+            images[1]["properties"]["description"], "Debian buster amd64 (20201210_13:00)")
+
+    def test_parse_across_chunk_boundaries(self):
+        text = json.dumps(CATALOG, indent=2)
+        expected = simplestreams.parse_products([text])
+
+        for size in [1, 3, 7, 64]:
+            self.assertEqual(
+                simplestreams.parse_products(chunked(text, size)), expected)
+
+    def test_parse_truncated_catalog(self):
+        text = json.dumps(CATALOG)
+        with self.assertRaises(LXCException):
+            simplestreams.parse_products(chunked(text[:-40], 16))
+
+
+class CatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SimplestreamsServer().__enter__()
+        self.remotes = mock.patch.dict(lxc_util.REMOTES, {
+            "test": {"Name": "test", "URL": self.server.url}})
+        self.remotes.start()
+
+    def tearDown(self):
+        self.remotes.stop()
+        self.server.__exit__()
+
+    def test_get_images(self):
+        with temporary_config():
+            images = catalog.get_images("test")
+
+        self.assertEqual(images, [
+            {
+                "alias": "alpine/3.11",
+                "aliases": ["alpine/3.11/default", "alpine/3.11"],
+                "description": "Alpine 3.11 amd64 (20201210_13:00)",
+                "fingerprint": "alpine/3.11/default,alpine/3.11-fingerprint",
+            },
+            {
+                "alias": "debian/10",
+                "aliases": ["debian/10", "debian/buster"],
+                "description": "Debian buster amd64 (20201210_13:00)",
+                "fingerprint": "debian/10,debian/buster-fingerprint",
+            },
+        ])
+
+    def test_fresh_cache_is_not_revalidated(self):
+        with temporary_config():
+            first = catalog.get_images("test")
+            second = catalog.get_images("test")
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.server.request_count, 2)
+
+    def test_stale_cache_is_revalidated(self):
+        with temporary_config(), mock.patch.object(config, "remote_catalog_ttl", -1):
+            first = catalog.get_images("test")
+            second = catalog.get_images("test")
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.server.request_count, 4)
+        self.assertEqual(self.server.not_modified, 2)
+
+    def test_offline(self):
+        with temporary_config():
+            with self.assertRaises(LXCException):
+                catalog.get_images("test", offline=True)
+
+            online = catalog.get_images("test")
+            self.server.request_count = 0
+            self.assertEqual(catalog.get_images("test", offline=True), online)
+            self.assertEqual(self.server.request_count, 0)
+
+    def test_unreachable_server_falls_back_to_cache(self):
+        with temporary_config(), mock.patch.object(config, "remote_catalog_ttl", -1):
+            cached = catalog.get_images("test")
+            lxc_util.REMOTES["test"]["URL"] = f"{self.server.url}/missing"
+            self.assertEqual(catalog.get_images("test"), cached)
+
+    def test_unreachable_server_without_cache(self):
+        lxc_util.REMOTES["test"]["URL"] = f"{self.server.url}/missing"
+        with temporary_config():
+            with self.assertRaises(LXCException):
+                catalog.get_images("test")
+
+
+class AliasIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = catalog.AliasIndex("images", [
+            {"alias": alias, "aliases": [alias, f"{alias}/default"],
+             "description": "", "fingerprint": f"{alias}-fingerprint"}
+            for alias in ["alpine/3.11", "alpine/3.12", "debian/10", "ubuntu/20.04"]
+        ])
+
+    def test_exact(self):
+        self.assertEqual(
+            self.index.resolve("debian/10/default")["fingerprint"], "debian/10-fingerprint")
+        self.assertIsNone(self.index.get("debian"))
+
+    def test_prefix(self):
+        self.assertEqual(
+            self.index.with_prefix("alpine/3.1"),
+            ["alpine/3.11", "alpine/3.11/default", "alpine/3.12", "alpine/3.12/default"])
+        self.assertEqual(self.index.with_prefix("fedora"), [])
+
+    def test_suggestions(self):
+        self.assertEqual(self.index.suggest("ubuntu"), ["ubuntu/20.04", "ubuntu/20.04/default"])
+        self.assertIn("debian/10", self.index.suggest("debain/10"))
+
+        with self.assertRaises(LXCException) as e:
+            self.index.resolve("debain/10")
+        self.assertIn("Did you mean debian/10", e.exception.message)
@@ -0,0 +1,87 @@
+import unittest
+from unittest import mock
+
+from paramiko import ssh_exception
+
+from testing.fixtures import temporary_config
+from yurt import config
+from yurt.exceptions import VMException
+from yurt.vm import ssh
+
+
+class StubConnection:
+    """
+    Stands in for fabric.Connection. The transport stays up until `drop`.
+    """
+    created = []
+
+    def __init__(self, host, user, port, connect_kwargs):
+        self.port = port
+        self.is_connected = False
+        self.closed = False
+        self.transport = mock.Mock()
+        self.run = mock.Mock(return_value=mock.Mock(stdout="out", stderr=""))
+        StubConnection.created.append(self)
+
+    def open(self):
+        self.is_connected = True
+
+    def close(self):
+        self.closed = True
+        self.is_connected = False
+
+    def drop(self):
+        self.is_connected = False
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        StubConnection.created = []
+        for patcher in [
+            mock.patch.object(ssh, "FabricConnection", StubConnection),
+            mock.patch.object(ssh, "_pool", ssh._ConnectionPool()),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_reuse(self):
+        with temporary_config(ssh_port=2222):
+            self.assertEqual(ssh.run_cmd("hostname"), ("out", ""))
+            ssh.run_cmd("uptime")
+
+        self.assertEqual(len(StubConnection.created), 1)
+        connection = StubConnection.created[0]
+        self.assertEqual(connection.run.call_count, 2)
+        connection.transport.set_keepalive.assert_called_once_with(config.ssh_keepalive_interval)
+        self.assertEqual(ssh.pool_stats(), {"hits": 1, "misses": 1})
+
+    def test_reconnect_on_dead_transport(self):
+        with temporary_config(ssh_port=2222):
+            ssh.run_cmd("hostname")
+            StubConnection.created[0].drop()
+            ssh.run_cmd("hostname")
+
+        self.assertEqual(len(StubConnection.created), 2)
+        self.assertTrue(StubConnection.created[0].closed)
+        self.assertEqual(ssh.pool_stats(), {"hits": 0, "misses": 2})
+
+    def test_reconnect_on_port_change(self):
+        with temporary_config(ssh_port=2222):
+            ssh.run_cmd("hostname")
+            config.set_config(config.Key.ssh_port, 2223)
+            ssh.run_cmd("hostname")
+
+        self.assertEqual([c.port for c in StubConnection.created], [2222, 2223])
+
+    def test_failed_command_discards_connection(self):
+        with temporary_config(ssh_port=2222):
+            ssh.run_cmd("hostname")
+            StubConnection.created[0].run.side_effect = ssh_exception.SSHException("reset")
+            with self.assertRaises(VMException):
+                ssh.run_cmd("hostname")
+            ssh.run_cmd("hostname")
+
+        self.assertTrue(StubConnection.created[0].closed)
+        self.assertEqual(len(StubConnection.created), 2)
+        self.assertEqual(ssh.pool_stats(), {"hits": 1, "misses": 2})
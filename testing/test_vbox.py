@@ -0,0 +1,205 @@
+import os
+import stat
+import unittest
+from unittest import mock
+
+from testing.fixtures import FakeVBoxManage, temporary_config
+from yurt import config, vm
+from yurt.exceptions import VBoxException
+from yurt.vm import vbox
+
+
+def make_executable(path, script="#!/bin/sh\n"):
+    with open(path, "w") as f:
+        f.write(script)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+
+@unittest.skipIf(config.system == config.System.windows, "Uses shell scripts.")
+class VBoxManageExecutableTest(unittest.TestCase):
+
+    def setUp(self):
+        vbox._executable["path"] = None
+        self.addCleanup(vbox._executable.update, {"path": None})
+        env = mock.patch.dict(os.environ)
+        env.start()
+        self.addCleanup(env.stop)
+        os.environ.pop("YURT_VBOXMANAGE", None)
+
+    def test_found_once_and_saved(self):
+        with temporary_config() as config_dir:
+            path = make_executable(os.path.join(config_dir, "VBoxManage"))
+            with mock.patch.object(vbox, "_find_vboxmanage_executable", return_value=path) as find:
+                self.assertEqual(vbox._get_vboxmanage_executable(), path)
+                self.assertEqual(vbox._get_vboxmanage_executable(), path)
+
+                vbox._executable["path"] = None
+                self.assertEqual(vbox._get_vboxmanage_executable(), path)
+
+            self.assertEqual(find.call_count, 1)
+            self.assertEqual(config.get_config(config.Key.vboxmanage_path), path)
+
+    def test_saved_path_is_validated(self):
+        with temporary_config(vboxmanage_path="/missing/VBoxManage") as config_dir:
+            path = make_executable(os.path.join(config_dir, "VBoxManage"))
+            with mock.patch.object(vbox, "_find_vboxmanage_executable", return_value=path):
+                self.assertEqual(vbox._get_vboxmanage_executable(), path)
+
+    def test_override(self):
+        with temporary_config(vboxmanage_path="/saved/VBoxManage") as config_dir:
+            path = make_executable(os.path.join(config_dir, "vboxmanage-wrapper"))
+            os.environ["YURT_VBOXMANAGE"] = path
+
+            self.assertEqual(vbox._get_vboxmanage_executable(), path)
+            self.assertEqual(
+                config.get_config(config.Key.vboxmanage_path), "/saved/VBoxManage")
+
+            vbox._executable["path"] = None
+            os.environ["YURT_VBOXMANAGE"] = os.path.join(config_dir, "missing")
+            with self.assertRaises(VBoxException):
+                vbox._get_vboxmanage_executable()
+
+    def test_removed_executable(self):
+        with temporary_config() as config_dir:
+            path = make_executable(os.path.join(config_dir, "VBoxManage"))
+            os.environ["YURT_VBOXMANAGE"] = path
+            vbox._get_vboxmanage_executable()
+            os.remove(path)
+
+            with self.assertRaises(VBoxException):
+                vbox.list_vms()
+            self.assertIsNone(vbox._executable["path"])
+
+
+HOSTONLYIFS = """Name:            VirtualBox Host-Only Ethernet Adapter
+GUID:            786f6276-656e-4074-8000-0a0027000000
+IPAddress:       192.168.56.1
+NetworkMask:     255.255.255.0
+IPV6Address:     fe80::a5d2:5e1:4bcc:3c1c
+
+Name:            VirtualBox Host-Only Ethernet Adapter #2
+IPAddress:       192.168.57.1
+NetworkMask:     255.255.255.0
+
+"""
+
+
+class ParserTest(unittest.TestCase):
+
+    def test_parse_host_only_interfaces(self):
+        interfaces = vbox.parse_host_only_interfaces(HOSTONLYIFS)
+
+        self.assertEqual(list(interfaces), [
+            "VirtualBox Host-Only Ethernet Adapter",
+            "VirtualBox Host-Only Ethernet Adapter #2",
+        ])
+        interface = interfaces["VirtualBox Host-Only Ethernet Adapter"]
+        self.assertEqual(interface.ip_address, "192.168.56.1")
+        self.assertEqual(interface.network_mask, "255.255.255.0")
+        self.assertEqual(interface.values["IPV6Address"], "fe80::a5d2:5e1:4bcc:3c1c")
+
+    def test_parse_malformed_host_only_interfaces(self):
+        with self.assertRaises(VBoxException):
+            vbox.parse_host_only_interfaces("Name: a\ngarbage\n")
+
+    def test_parse_machine_readable(self):
+        values = vbox.parse_machine_readable(
+            'name="yurt"\nmemory=2048\n"SCSI-0-0"="C:\\\\disk.vmdk"\nnatnet1="nat"\n')
+
+        self.assertEqual(values, {
+            "name": "yurt", "memory": "2048", "SCSI-0-0": "C:\\\\disk.vmdk", "natnet1": "nat"})
+
+    def test_parse_vm_list(self):
+        self.assertEqual(
+            vbox.parse_vm_list('"yurt-1" {abc}\n"my vm" {def}\n'),
+            [("yurt-1", "abc"), ("my vm", "def")])
+
+
+@unittest.skipIf(config.system == config.System.windows, "Uses shell scripts.")
+class SnapshotTest(unittest.TestCase):
+
+    def test_create_hostonly_interface(self):
+        with FakeVBoxManage(hostonlyifs=1) as fake:
+            name = vbox.create_hostonly_interface()
+            info = vbox.get_interface_info(name)
+
+            self.assertEqual(name, "VirtualBox Host-Only Ethernet Adapter #2")
+            self.assertEqual(info.ip_address, "192.168.57.1")
+            self.assertEqual(fake.calls, [
+                ["list", "hostonlyifs"], ["hostonlyif", "create"], ["list", "hostonlyifs"]])
+
+    def test_mutations_invalidate_snapshots(self):
+        with FakeVBoxManage(vms={"yurt": {}}) as fake, temporary_config(vm_name="yurt"):
+            self.assertEqual(vm.state(), vm.State.Stopped)
+            self.assertEqual(vm.state(), vm.State.Stopped)
+            self.assertEqual(len(fake.calls), 1)
+
+            vbox.start_vm("yurt")
+            self.assertEqual(vm.state(), vm.State.Running)
+
+            vbox.modify_vm("yurt", {"memory": "4096"})
+            self.assertEqual(vbox.get_vm_info("yurt").memory, "4096")
+            self.assertEqual(len(fake.calls), 5)
+
+    def test_snapshots_expire(self):
+        with FakeVBoxManage(vms={"yurt": {}}) as fake, \
+                mock.patch.object(config, "vm_state_ttl", 0):
+            vbox.list_vms()
+            vbox.list_vms()
+
+            self.assertEqual(len(fake.calls), 2)
+
+
+@unittest.skipIf(config.system == config.System.windows, "Uses shell scripts.")
+class ModifyVmTest(unittest.TestCase):
+
+    def modifyvm_calls(self, fake):
+        return [call for call in fake.calls if call[0] == "modifyvm"]
+
+    def test_batch_is_one_modifyvm(self):
+        with FakeVBoxManage(vms={"yurt": {}}) as fake:
+            with vbox.batch_modify_vm("yurt") as settings:
+                settings["memory"] = "4096"
+                settings["nic1"] = "nat"
+                settings.update(vbox.serial_console_settings("/tmp/console.log"))
+
+            self.assertEqual(self.modifyvm_calls(fake), [[
+                "modifyvm", "yurt", "--memory", "4096", "--nic1", "nat",
+                "--uart1", "0x3F8", "4", "--uartmode1", "file", "/tmp/console.log"]])
+            self.assertEqual(fake.state["vms"]["yurt"]["uart1"], "0x03f8,4")
+
+    def test_failed_batch_is_not_applied(self):
+        with FakeVBoxManage(vms={"yurt": {}}) as fake:
+            with self.assertRaises(ValueError):
+                with vbox.batch_modify_vm("yurt") as settings:
+                    settings["memory"] = "4096"
+                    raise ValueError
+
+            self.assertEqual(self.modifyvm_calls(fake), [])
+
+    def test_unchanged_settings_are_skipped(self):
+        with FakeVBoxManage(vms={"yurt": {}}) as fake:
+            vbox.attach_serial_console("yurt", "/tmp/console.log")
+            vbox.attach_serial_console("yurt", "/tmp/console.log")
+            self.assertEqual(len(self.modifyvm_calls(fake)), 1)
+
+            vbox.attach_serial_console("yurt", "/tmp/other.log")
+            self.assertEqual(self.modifyvm_calls(fake)[-1], [
+                "modifyvm", "yurt", "--uartmode1", "file", "/tmp/other.log"])
+
+            vbox.modify_vm("yurt", {"memory": "2048", "cpus": "4"}, skip_unchanged=True)
+            self.assertEqual(self.modifyvm_calls(fake)[-1], [
+                "modifyvm", "yurt", "--cpus", "4"])
+
+    def test_paths_are_compared_verbatim(self):
+        with FakeVBoxManage(vms={"yurt": {}}) as fake:
+            vbox.attach_serial_console("yurt", "/tmp/console.log")
+            vbox.attach_serial_console("yurt", "/tmp/Console.log")
+
+            self.assertEqual(self.modifyvm_calls(fake)[-1], [
+                "modifyvm", "yurt", "--uartmode1", "file", "/tmp/Console.log"])
+
+    def test_normalize_setting(self):
+        self.assertEqual(vbox._normalize_setting(["0x3F8", "ON"]), "1016,on")
+        self.assertEqual(vbox._normalize_setting(["0xfile", "C:\\Yurt"]), "0xfile,C:\\Yurt")
@@ -0,0 +1,346 @@
+"""
+Optional long-lived local agent.
+
+The agent keeps yurt's modules imported and its process-level state warm
+(VM state, LXD client, SSH session) between CLI invocations. Commands reach it
+through `call`, which falls back to running in-process when no agent is
+listening.
+"""
+import atexit
+import logging
+import os
+import sys
+
+from yurt import config
+from yurt.exceptions import AgentException, YurtException
+
+
+# Functions that may be run by the agent on behalf of the CLI.
+# They must not prompt for input or render progress.
+_COMMANDS = {
+    "vm.state": ("yurt.vm", "state"),
+    "vm.info": ("yurt.vm", "info"),
+    "lxc.list_": ("yurt.lxc", "list_"),
+    "lxc.start": ("yurt.lxc", "start"),
+    "lxc.stop": ("yurt.lxc", "stop"),
+    "lxc.delete": ("yurt.lxc", "delete"),
+    "lxc.list_cached_images": ("yurt.lxc", "list_cached_images"),
+    "lxc.list_remote_images": ("yurt.lxc", "list_remote_images"),
+}
+
+_PING = "agent.ping"
+_SHUTDOWN = "agent.shutdown"
+_RESET = "agent.reset"
+
+# Seconds to wait for a client to send its first request.
+_REQUEST_TIMEOUT = 5
+# Seconds between checks for shutdown while waiting for a request.
+_POLL_INTERVAL = 0.2
+# Seconds to wait for a newly spawned agent to come up.
+_START_TIMEOUT = 5
+
+
+def _resolve(name: str):
+    import importlib
+
+    try:
+        module_name, attribute = _COMMANDS[name]
+    except KeyError:
+        raise AgentException(f"Unsupported agent command: {name}")
+
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def _get_authkey(create=False):
+    try:
+        with open(config.agent_key_file, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        if not create:
+            return None
+
+    if not os.path.isdir(config.config_dir):
+        os.makedirs(config.config_dir)
+
+    authkey = os.urandom(32)
+    fd = os.open(config.agent_key_file, os.O_WRONLY |
+                 os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey)
+    return authkey
+
+
+def _connect():
+    """
+    Connect to a running agent. Returns None if none is reachable.
+    """
+    from multiprocessing.connection import AuthenticationError, Client
+
+    authkey = _get_authkey()
+    if not authkey:
+        return None
+
+    try:
+        return Client(config.agent_address, authkey=authkey)
+    except (OSError, EOFError, AuthenticationError) as e:
+        logging.debug(f"Agent unavailable: {e}")
+        return None
+
+
+def _request(connection, name: str, args=(), kwargs=None):
+    try:
+        connection.send((name, args, kwargs or {}))
+        status, value, records = connection.recv()
+    except (OSError, EOFError) as e:
+        logging.debug(e)
+        if connection is _connection["value"]:
+            close()
+        raise AgentException("Lost connection to the yurt agent.")
+
+    for record in records:
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+
+    if status == "error":
+        raise value
+    return value
+
+
+# Connection to the agent, opened by a command's first request and reused
+# by the rest. False if no agent was reachable.
+_connection = {"value": None}
+
+
+def _shared_connection():
+    if _connection["value"] is None:
+        _connection["value"] = _connect() or False
+    return _connection["value"] or None
+
+
+@atexit.register
+def close():
+    connection = _connection["value"]
+    _connection["value"] = None
+    if connection:
+        connection.close()
+
+
+def call(name: str, *args, **kwargs):
+    """
+    Run the command registered as `name` in the agent if one is running.
+    Otherwise, run it in this process.
+    """
+    connection = _shared_connection()
+    if connection is None:
+        return _resolve(name)(*args, **kwargs)
+
+    return _request(connection, name, args, kwargs)
+
+
+def is_running():
+    connection = _connect()
+    if connection is None:
+        return False
+
+    with connection:
+        try:
+            return _request(connection, _PING) == config.version
+        except AgentException:
+            return False
+
+
+def vm_is_running():
+    """
+    Ask the agent whether the VM is up. False if no agent is running.
+    """
+    from yurt import vm
+
+    connection = _shared_connection()
+    if connection is None:
+        return False
+
+    try:
+        return _request(connection, "vm.state") == vm.State.Running
+    except YurtException as e:
+        logging.debug(e.message)
+        return False
+
+
+def reset():
+    """
+    Drop any state held by a running agent. Used after VM lifecycle changes.
+    """
+    connection = _connect()
+    if connection is not None:
+        with connection:
+            _request(connection, _RESET)
+
+
+def start():
+    from yurt.util import sleep_for, spawn_detached, yurt_command
+
+    if is_running():
+        logging.info("The yurt agent is already running.")
+        return
+
+    _get_authkey(create=True)
+    spawn_detached(yurt_command("agent", "run"))
+
+    for _ in range(_START_TIMEOUT * 4):
+        if is_running():
+            logging.info("Yurt agent started.")
+            return
+        sleep_for(0.25)
+
+    raise AgentException("The yurt agent did not start.")
+
+
+def stop():
+    connection = _connect()
+    if connection is None:
+        logging.info("The yurt agent is not running.")
+        return
+
+    with connection:
+        _request(connection, _SHUTDOWN)
+    logging.info("Yurt agent stopped.")
+
+
+class _RecordCollector(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        # Pre-format the message so the record pickles regardless of its args.
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+
+def _reset_state():
+    """
+    Forget process-level caches so the next command starts from fresh state.
+    """
+    from yurt import vm
+    from yurt.vm import ssh
+
+    vm.invalidate_state()
+    ssh.close()
+
+    if "yurt.lxc" in sys.modules:
+        from yurt.lxc import util as lxc_util
+        lxc_util.reset_pylxd_client()
+
+
+def _handle(name: str, args, kwargs):
+    """
+    Run a single request. Returns the response with the log records
+    emitted while it ran.
+    """
+    collector = _RecordCollector()
+    root = logging.getLogger()
+    root.addHandler(collector)
+    try:
+        if name in [_PING, _SHUTDOWN]:
+            response = ("ok", config.version if name == _PING else None)
+        elif name == _RESET:
+            _reset_state()
+            response = ("ok", None)
+        else:
+            response = ("ok", _resolve(name)(*args, **kwargs))
+    except YurtException as e:
+        response = ("error", e)
+    except Exception as e:
+        logging.debug(f"Agent command {name} failed: {e}")
+        response = ("error", AgentException(f"Agent command failed: {e}"))
+    finally:
+        root.removeHandler(collector)
+
+    return response + (collector.records,)
+
+
+def _serve(connection, lock, stopping, shut_down):
+    """
+    Serve one client's requests until it disconnects or the agent stops.
+    """
+    import time
+
+    with connection:
+        # Clients that connect but send nothing are dropped.
+        deadline = time.monotonic() + _REQUEST_TIMEOUT
+        while True:
+            try:
+                while not connection.poll(_POLL_INTERVAL):
+                    if stopping.is_set() or \
+                            (deadline and time.monotonic() > deadline):
+                        return
+                if stopping.is_set():
+                    return
+                name, args, kwargs = connection.recv()
+            except (OSError, EOFError):
+                return
+            deadline = None
+
+            with lock:
+                response = _handle(name, args, kwargs)
+
+            try:
+                connection.send(response)
+            except (OSError, EOFError) as e:
+                logging.debug(e)
+                return
+
+            if name == _SHUTDOWN:
+                shut_down()
+                return
+
+
+def run():
+    """
+    Serve agent requests in the foreground until asked to stop.
+    Each client gets a thread, but requests are handled one at a time.
+    """
+    import threading
+    from multiprocessing.connection import AuthenticationError, Client, Listener
+
+    if config.system != config.System.windows and \
+            os.path.exists(config.agent_address):
+        if is_running():
+            raise AgentException("The yurt agent is already running.")
+        os.remove(config.agent_address)
+
+    authkey = _get_authkey(create=True)
+
+    # Forward everything. Clients filter by their own log level.
+    logging.getLogger().setLevel(logging.DEBUG)
+
+    lock = threading.Lock()
+    stopping = threading.Event()
+
+    def shut_down():
+        stopping.set()
+        # Wake up accept().
+        try:
+            Client(config.agent_address, authkey=authkey).close()
+        except (OSError, EOFError, AuthenticationError) as e:
+            logging.debug(e)
+
+    with Listener(config.agent_address, authkey=authkey) as listener:
+        logging.info(f"Yurt agent listening on {config.agent_address}")
+        while not stopping.is_set():
+            try:
+                connection = listener.accept()
+            except (OSError, EOFError, AuthenticationError) as e:
+                logging.debug(f"Rejected agent connection: {e}")
+                continue
+
+            if stopping.is_set():
+                connection.close()
+                break
+
+            threading.Thread(
+                target=_serve, args=(connection, lock, stopping, shut_down),
+                daemon=True).start()
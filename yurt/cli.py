@@ -4,7 +4,7 @@ import os
 from tabulate import tabulate
 
 from yurt.exceptions import YurtException
-from yurt import vm, lxc, config
+from yurt import agent, vm, config
 
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
@@ -76,13 +76,17 @@ def vm_():
 
 
 @vm_.command()
-def init():
+@click.option("--connections", type=click.IntRange(min=1), default=config.image_download_connections,
+              show_default=True, help="Download the VM image on this many connections at once. May help on slow links.")
+@click.option("--verify", is_flag=True, help="Rehash a previously downloaded VM image instead of trusting the earlier check.")
+def init(connections, verify):
     """
     Initialize the VM.
     """
 
     try:
-        vm.ensure_is_ready(prompt_init=False, prompt_start=True)
+        vm.ensure_is_ready(prompt_init=False, prompt_start=True,
+                           download_connections=connections, verify_image=verify)
     except YurtException as e:
         logging.error(e.message)
 
@@ -124,6 +128,7 @@ def restart(force):
     try:
         if vm.state() == vm.State.Running:
             vm.stop(force=force)
+            agent.reset()
         vm.ensure_is_ready(prompt_init=True, prompt_start=False)
     except YurtException as e:
         logging.error(e.message)
@@ -154,6 +159,7 @@ def destroy(force):
             )
         else:
             vm.destroy()
+            agent.reset()
     except YurtException as e:
         if force:
             vm.delete_instance_files()
@@ -176,6 +182,7 @@ def halt(force):
 
     try:
         vm.stop(force=force)
+        agent.reset()
     except YurtException as e:
         logging.error(e.message)
         if not force:
@@ -190,7 +197,7 @@ def info():
     """
 
     try:
-        for k, v in vm.info().items():
+        for k, v in agent.call("vm.info").items():
             click.echo(f"{k}: {v}")
 
         vm.ensure_is_ready()
@@ -201,18 +208,39 @@ def info():
 # Instances #############################################################
 
 
+parallel_option = click.option(
+    "-p", "--parallel", type=click.IntRange(min=1), default=config.lxd_max_workers, show_default=True,
+    help="Maximum number of containers to operate on at a time."
+)
+
+
+count_option = click.option(
+    "-c", "--count", type=click.IntRange(min=1), help="Launch N containers named <name>-1 to <name>-N.")
+
+
+def _expand_names(names, count):
+    if count is not None:
+        if len(names) != 1:
+            raise click.UsageError("--count takes exactly one <name>.")
+        return [f"{names[0]}-{i}" for i in range(1, count + 1)]
+    return list(names)
+
+
 @main.command()
 @click.argument("image", metavar="<image>")
-@click.argument("name")
-def launch(image, name):
+@click.argument("names", metavar="<name>...", nargs=-1)
+@count_option
+@click.option("--from-template", is_flag=True, help="<image> is a container to clone. See 'yurt clone'.")
+@parallel_option
+def launch(image, names, count, from_template, parallel):
     """
-    Create and start a container.
+    Create and start one or more containers.
 
     \b
     <image>     -   Image to use as source. e.g. ubuntu/18.04 or alpine/3.11.
                     Only images in https://images.linuxcontainers.org
                     are supported at this time. Run 'yurt images' to list them.
-    NAME        -   Container name
+    <name>...   -   Container names
 
     \b
     Container names must:
@@ -221,17 +249,80 @@ def launch(image, name):
     * not start with a digit or a dash
     * not end with a dash
 
+    The image is downloaded once. When launching several containers, they are
+    created and started concurrently.
+
     EXAMPLES:
 
     \b
-    $ yurt launch ubuntu/18.04 c1       -   Create and start an ubuntu 18.04 container.
+    $ yurt launch ubuntu/18.04 c1           -   Create and start an ubuntu 18.04 container.
+    $ yurt launch alpine/3.11 web1 web2     -   Create and start two alpine containers.
+    $ yurt launch alpine/3.11 web -c 20     -   Create and start web-1 to web-20.
+    $ yurt launch --from-template base c3   -   Create and start c3 as a copy of 'base'.
 
     """
 
+    from yurt import lxc
+
+    full_help_if_missing(names)
+    names = _expand_names(names, count)
+
+    if from_template:
+        return _clone(image, names, parallel)
+
     try:
-        vm.ensure_is_ready()
+        # Fail on an unknown image before starting the VM.
+        source = lxc.resolve_image("images", image)
+        _ensure_vm_is_ready()
 
-        lxc.launch("images", image, name)
+        results = lxc.launch_many(
+            "images", image, names, max_workers=parallel, source=source)
+        report_results(results, "launch")
+
+    except YurtException as e:
+        logging.error(e.message)
+
+
+@main.command()
+@click.argument("source", metavar="<source>")
+@click.argument("names", metavar="<name>...", nargs=-1)
+@count_option
+@parallel_option
+def clone(source, names, count, parallel):
+    """
+    Create and start containers as copies of an existing container.
+
+    \b
+    <source>    -   Container to copy. Preferably a stopped container that
+                    has already been set up.
+    <name>...   -   Names of the new containers.
+
+    Copies are snapshot clones on yurt's ZFS storage pool, so they are created
+    almost instantly and include everything installed in <source>.
+
+    EXAMPLES:
+
+    \b
+    $ yurt launch ubuntu/18.04 base         -   Create a container...
+    $ yurt shell base                       -   ...set it up...
+    $ yurt stop base                        -   ...and stop it.
+    $ yurt clone base dev1 dev2             -   Create and start copies of it.
+    $ yurt clone base dev -c 10             -   Create and start dev-1 to dev-10.
+
+    """
+
+    full_help_if_missing(names)
+    _clone(source, _expand_names(names, count), parallel)
+
+
+def _clone(source, names, parallel):
+    from yurt import lxc
+
+    try:
+        _ensure_vm_is_ready()
+
+        results = lxc.clone(source, names, max_workers=parallel)
+        report_results(results, "create")
 
     except YurtException as e:
         logging.error(e.message)
@@ -239,7 +330,8 @@ def launch(image, name):
 
 @main.command()
 @click.argument("instances", metavar="<name>...", nargs=-1)
-def start(instances):
+@parallel_option
+def start(instances, parallel):
     """
     Start one or more containers.
     """
@@ -247,9 +339,11 @@ def start(instances):
     full_help_if_missing(instances)
 
     try:
-        vm.ensure_is_ready()
+        _ensure_vm_is_ready()
 
-        lxc.start(list(instances))
+        results = agent.call(
+            "lxc.start", list(instances), max_workers=parallel)
+        report_results(results, "start")
 
     except YurtException as e:
         logging.error(e.message)
@@ -257,7 +351,8 @@ def start(instances):
 
 @main.command()
 @click.argument("instances", metavar="<name>...", nargs=-1)
-def stop(instances):
+@parallel_option
+def stop(instances, parallel):
     """
     Stop one or more containers.
     """
@@ -265,9 +360,11 @@ def stop(instances):
     full_help_if_missing(instances)
 
     try:
-        vm.ensure_is_ready()
+        _ensure_vm_is_ready()
 
-        click.echo(lxc.stop(list(instances)))
+        results = agent.call(
+            "lxc.stop", list(instances), max_workers=parallel)
+        report_results(results, "stop")
 
     except YurtException as e:
         logging.error(e.message)
@@ -275,7 +372,8 @@ def stop(instances):
 
 @main.command()
 @click.argument("instances", metavar="<name>...", nargs=-1)
-def delete(instances):
+@parallel_option
+def delete(instances, parallel):
     """
     Delete one or more containers.
     """
@@ -283,9 +381,11 @@ def delete(instances):
     full_help_if_missing(instances)
 
     try:
-        vm.ensure_is_ready()
+        _ensure_vm_is_ready()
 
-        lxc.delete(list(instances))
+        results = agent.call(
+            "lxc.delete", list(instances), max_workers=parallel)
+        report_results(results, "delete")
 
     except YurtException as e:
         logging.error(e.message)
@@ -298,9 +398,9 @@ def list_():
     """
 
     try:
-        vm.ensure_is_ready()
+        _ensure_vm_is_ready()
 
-        instances = tabulate(lxc.list_(), headers="keys")
+        instances = tabulate(agent.call("lxc.list_"), headers="keys")
         if instances:
             click.echo(instances)
         else:
@@ -323,32 +423,39 @@ def shell(instance):
     IP address.
     """
 
+    from yurt import lxc
+
     try:
-        vm.ensure_is_ready()
+        _ensure_vm_is_ready()
         lxc.shell(instance)
     except YurtException as e:
         logging.error(e.message)
 
 
-@main.command()
+@main.group(invoke_without_command=True)
 @click.option("-r", "--remote", is_flag=True, help="List remote images. Only images at https://images.linuxcontainers.org are supported at this time.")
-def images(remote):
+@click.option("--offline", is_flag=True, help="List remote images from the local cache without checking for updates. Implies --remote.")
+@click.pass_context
+def images(ctx, remote, offline):
     """
     List images that can be used to launch a container.
 
+    Remote image lists are cached and checked for updates every few hours.
     """
 
+    if ctx.invoked_subcommand:
+        return
+
     remote_server = "images"
     try:
-        vm.ensure_is_ready()
-
-        if remote:
+        if remote or offline:
             images = tabulate(
-                lxc.list_remote_images(remote_server), headers="keys", disable_numparse=True
+                agent.call("lxc.list_remote_images", remote_server, offline=offline), headers="keys", disable_numparse=True
             )
         else:
+            _ensure_vm_is_ready()
             images = tabulate(
-                lxc.list_cached_images(), headers="keys", disable_numparse=True
+                agent.call("lxc.list_cached_images"), headers="keys", disable_numparse=True
             )
 
         click.echo(images)
@@ -357,8 +464,202 @@ def images(remote):
         logging.error(e.message)
 
 
+@images.command()
+@click.argument("names", metavar="<image>...", nargs=-1)
+@click.option("--auto-update/--no-auto-update", default=False, show_default=True,
+              help="Let LXD keep the pulled images up to date.")
+@click.option("-p", "--parallel", type=click.IntRange(min=1), default=config.lxd_max_workers,
+              show_default=True, help="Maximum number of images to pull at a time.")
+def pull(names, auto_update, parallel):
+    """
+    Download images ahead of time so that launching from them is quick.
+
+    \b
+    <image>...  -   Images to pull. e.g. ubuntu/18.04 alpine/3.11.
+                    Run 'yurt images -r' to list them.
+    """
+
+    from yurt import lxc
+
+    full_help_if_missing(names)
+
+    try:
+        _ensure_vm_is_ready()
+
+        results = lxc.pull_images(
+            "images", list(names), auto_update=auto_update, max_workers=parallel)
+        report_results(results, "pull", noun="image")
+
+    except YurtException as e:
+        logging.error(e.message)
+
+
+# Warm Pools ############################################################
+
+
+@main.group(name="pool")
+def pool_():
+    """
+    Keep stopped containers ready for quick launches.
+
+    When an image has a warm pool, 'yurt launch' takes a container from the
+    pool instead of creating one, and the pool is refilled in the background.
+
+    EXAMPLES:
+
+    \b
+    $ yurt pool set alpine/3.11 5     -   Keep 5 alpine/3.11 containers ready.
+    $ yurt pool set alpine/3.11 0     -   Remove the alpine/3.11 pool.
+    $ yurt pool status                -   Show pools and hit rates.
+    """
+
+
+@pool_.command(name="set")
+@click.argument("image", metavar="<image>")
+@click.argument("size", metavar="<size>", type=click.IntRange(min=0))
+def set_pool(image, size):
+    """
+    Set the number of containers to keep ready for <image>.
+    """
+
+    from yurt import lxc
+    from yurt.lxc import pool
+
+    try:
+        if size:
+            lxc.resolve_image(pool.REMOTE, image)
+        _ensure_vm_is_ready()
+
+        pool.set_size(image, size)
+        pool.fill_in_background(image)
+        logging.info("The pool is being filled in the background.")
+    except YurtException as e:
+        logging.error(e.message)
+
+
+@pool_.command(name="status")
+def pool_status():
+    """
+    Show warm pools with their hits and misses.
+    """
+
+    from yurt.lxc import pool
+
+    try:
+        _ensure_vm_is_ready()
+        click.echo(tabulate(pool.status(), headers="keys", disable_numparse=True))
+    except YurtException as e:
+        logging.error(e.message)
+
+
+@pool_.command(name="fill")
+@click.argument("images", metavar="[image]...", nargs=-1)
+@click.option("--background", is_flag=True, hidden=True)
+def fill_pool(images, background):
+    """
+    Bring pools to their configured size now.
+    """
+
+    from yurt.lxc import pool
+
+    try:
+        if background and vm.state() != vm.State.Running:
+            # Started by a launch, without a terminal to prompt on.
+            logging.debug("Yurt is not running. Skipping pool fill.")
+            return
+
+        _ensure_vm_is_ready()
+        pool.fill(list(images))
+    except YurtException as e:
+        logging.error(e.message)
+
+
+# Agent #################################################################
+
+
+@main.group(name="agent")
+def agent_():
+    """
+    Manage the optional yurt agent.
+
+    The agent is a background process that keeps yurt's state warm between
+    commands so that frequently run commands like 'yurt list' start faster.
+    Commands run in-process as usual when the agent is not running.
+    """
+
+
+@agent_.command(name="start")
+def start_agent():
+    """
+    Start the agent in the background.
+    """
+
+    try:
+        agent.start()
+    except YurtException as e:
+        logging.error(e.message)
+
+
+@agent_.command(name="stop")
+def stop_agent():
+    """
+    Stop the agent.
+    """
+
+    try:
+        agent.stop()
+    except YurtException as e:
+        logging.error(e.message)
+
+
+@agent_.command(name="status")
+def agent_status():
+    """
+    Show whether the agent is running.
+    """
+
+    if agent.is_running():
+        click.echo(f"Running: {config.agent_address}")
+    else:
+        click.echo("Not running")
+
+
+@agent_.command(name="run", hidden=True)
+def run_agent():
+    """
+    Run the agent in the foreground.
+    """
+
+    try:
+        agent.run()
+    except YurtException as e:
+        logging.error(e.message)
+
+
 # CLI Utilities ########################################################
 
+def _ensure_vm_is_ready():
+    """
+    Skip the VM readiness checks if the agent already knows the VM is up.
+    """
+    if not agent.vm_is_running():
+        vm.ensure_is_ready()
+
+
+def report_results(results, action: str, noun: str = "container"):
+    """
+    Summarize per-container results. Single successes are not reported.
+    """
+    failed = [r for r in results if r["Status"] != "OK"]
+
+    if len(results) > 1 or failed:
+        click.echo(tabulate(results, headers="keys"))
+
+    if failed:
+        logging.error(
+            f"Failed to {action} {len(failed)} of {len(results)} {noun}(s).")
+
+
 def full_help_if_missing(arg):
     if not arg:
         ctx = click.get_current_context()
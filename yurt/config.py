@@ -1,6 +1,8 @@
 import logging
 import os
+from contextlib import contextmanager
 from enum import Enum
+from typing import Any, Dict
 import platform
 import sys
 
@@ -18,6 +20,10 @@ class Key(Enum):
     ssh_port = 5
     is_lxd_initialized = 6
     lxd_port = 7
+    readiness_fingerprint = 8
+    warm_pools = 9
+    warm_pool_stats = 10
+    vboxmanage_path = 11
 
 
 class System(Enum):
@@ -61,6 +67,11 @@ vm_memory = 2048  # MB
 storage_pool_disk_size_mb = 64000  # MB
 user_name = "yurt"
 port_range = (55000, 59999)
+vm_state_ttl = 2  # seconds. How long a fetched VM state is reused.
+ssh_keepalive_interval = 30  # seconds
+lxd_max_workers = 8  # Concurrent requests to LXD.
+remote_catalog_ttl = 6 * 60 * 60  # seconds. Age at which cached image lists are revalidated.
+image_download_connections = 1  # Connections used to download the VM image.
 
 
 # Instance Paths ############################################################
@@ -69,7 +80,15 @@ vm_install_dir = os.path.join(config_dir, "vm")
 image = os.path.join(config_dir, "image", os.path.basename(image_url))
 storage_pool_disk = os.path.join(vm_install_dir, "yurt-storage-pool.vmdk")
 config_disk = os.path.join(vm_install_dir, "yurt-config.vmdk")
-remote_tmp = "/tmp/yurt"
+remote_catalog_dir = os.path.join(config_dir, "catalogs")
+agent_key_file = os.path.join(config_dir, "agent.key")
+config_lock_file = os.path.join(config_dir, "config.lock")
+vm_lock_file = os.path.join(config_dir, "vm.lock")
+pool_lock_file = os.path.join(config_dir, "pool.lock")
+if system == System.windows:
+    agent_address = fr"\\.\pipe\{_app_dir_name}-agent"
+else:
+    agent_address = os.path.join(config_dir, "agent.sock")
 
 
 # Source Paths ##############################################################
@@ -89,13 +108,55 @@ def _ensure_config_file_exists():
             f.write('{}')
 
 
+# Parsed config, reused while the file's identity (see _file_identity) is unchanged.
+_cache = {"identity": None, "config": None}
+
+
+def _file_identity():
+    stat = os.stat(_config_file)
+    return (_config_file, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+# Windows refuses to replace config.json while another process has it open,
+# and to open it while it is being replaced. Both last milliseconds.
+_SHARING_RETRIES = 20
+_SHARING_RETRY_WAIT = 0.05  # seconds
+
+
+def _retry_sharing_violations(fn, *args):
+    import time
+
+    for attempt in range(_SHARING_RETRIES):
+        try:
+            return fn(*args)
+        except PermissionError:
+            if attempt == _SHARING_RETRIES - 1:
+                raise
+            time.sleep(_SHARING_RETRY_WAIT)
+
+
+def _load_config_file():
+    import json
+
+    with open(_config_file, 'r') as f:
+        return json.load(f)
+
+
 def _read_config():
+    import copy
     import json
 
     try:
-        _ensure_config_file_exists()
-        with open(_config_file, 'r') as f:
-            return json.load(f)
+        try:
+            identity = _file_identity()
+        except FileNotFoundError:
+            _ensure_config_file_exists()
+            identity = _file_identity()
+
+        if identity != _cache["identity"]:
+            _cache["config"] = _retry_sharing_violations(_load_config_file)
+            _cache["identity"] = identity
+        return copy.deepcopy(_cache["config"])
     except FileNotFoundError:
         msg = 'Config file not found'
         logging.error(msg)
@@ -107,15 +168,32 @@ def _read_config():
 
 
 def _write_config(config):
+    """
+    Replace the config file atomically, so that it is never left half written.
+    """
+    import copy
     import json
+    import tempfile
 
+    tmp_file = None
     try:
         _ensure_config_file_exists()
-        with open(_config_file, 'w') as f:
+        fd, tmp_file = tempfile.mkstemp(dir=config_dir, prefix=".config-")
+        with os.fdopen(fd, 'w') as f:
             json.dump(config, f)
+            f.flush()
+            os.fsync(f.fileno())
+        _retry_sharing_violations(os.replace, tmp_file, _config_file)
+        tmp_file = None
+
+        _cache["config"] = copy.deepcopy(config)
+        _cache["identity"] = _file_identity()
     except Exception as e:
         logging.error(f"Error writing config: {e}")
         raise ConfigWriteException(e)
+    finally:
+        if tmp_file and os.path.exists(tmp_file):
+            os.remove(tmp_file)
 
 
 def get_config(key: Key):
@@ -125,21 +203,51 @@ def get_config(key: Key):
 
 
 def set_config(key: Key, value: str):
-    old = _read_config()
+    set_many({key: value})
 
-    if old is None:
-        return
 
-    new = old.copy()
-    new[key.name] = value
+def set_many(values: Dict[Key, Any]):
+    """
+    Set several keys with a single write. Either all of them are saved or,
+    if the write fails, none are.
+    """
+    from yurt.util import file_lock
 
-    try:
+    with file_lock(config_lock_file):
+        old = _read_config()
+
+        if old is None:
+            return
+
+        new = old.copy()
+        new.update({key.name: value for key, value in values.items()})
         _write_config(new)
-    except ConfigWriteException:
-        _write_config(old)
-        raise ConfigWriteException
+
+
+@contextmanager
+def transaction():
+    """
+    Collect updates and save them together with set_many when the block exits.
+    Nothing is saved if the block raises. Other processes cannot change the
+    config while the block runs, so values read with get_config inside it
+    stay current.
+
+        with config.transaction() as updates:
+            updates[Key.ssh_port] = ssh_port
+            ...
+    """
+    from yurt.util import file_lock
+
+    with file_lock(config_lock_file):
+        updates = {}
+        yield updates
+        if updates:
+            set_many(updates)
 
 
 def clear():
+    from yurt.util import file_lock
+
     logging.debug("Clearing config")
-    _write_config({})
+    with file_lock(config_lock_file):
+        _write_config({})
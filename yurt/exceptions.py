@@ -33,3 +33,7 @@ class ConfigReadException(YurtException):
 
 class ConfigWriteException(YurtException):
     pass
+
+
+class AgentException(YurtException):
+    pass
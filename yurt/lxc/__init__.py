@@ -1,7 +1,9 @@
 from .lxc import (
+    clone,
     exec_,
     ensure_is_ready,
     launch,
+    launch_many,
     list_,
     delete,
     start,
@@ -9,4 +11,6 @@ from .lxc import (
     shell,
     list_cached_images,
     list_remote_images,
+    pull_images,
+    resolve_image,
 )
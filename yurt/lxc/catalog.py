@@ -0,0 +1,292 @@
+"""
+On-disk cache of remote image catalogs.
+
+Each remote in util.REMOTES gets a file under config.remote_catalog_dir with
+the images it offers, already filtered and reduced to what yurt shows and
+needs to launch them. Catalogs are revalidated with ETag / Last-Modified
+once they are older than config.remote_catalog_ttl.
+"""
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from yurt import config
+from yurt.exceptions import LXCException
+from . import simplestreams, util
+
+
+_CACHE_VERSION = 1
+
+
+def _cache_file(remote: str):
+    return os.path.join(config.remote_catalog_dir, f"{remote}.json")
+
+
+def _load(remote: str):
+    try:
+        with open(_cache_file(remote), "r") as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.debug(f"Ignoring unreadable image catalog cache: {e}")
+        return None
+
+    if cache.get("version") != _CACHE_VERSION:
+        return None
+    return cache
+
+
+def _save(remote: str, cache: Dict):
+    import tempfile
+
+    os.makedirs(config.remote_catalog_dir, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(dir=config.remote_catalog_dir)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, _cache_file(remote))
+    except OSError as e:
+        logging.debug(f"Could not save image catalog cache: {e}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def _validators(response):
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def _compact(remote: str, image: Dict):
+    aliases = [a["name"] for a in image["aliases"]]
+    alias = util.shortest_alias(aliases, remote)
+    if not alias:
+        return None
+
+    return {
+        "alias": alias,
+        "aliases": aliases,
+        "description": image["properties"]["description"],
+        "fingerprint": image["fingerprint"],
+    }
+
+
+def _refresh(remote: str, cache: Dict):
+    """
+    Fetch what changed since `cache` was saved. Returns the new cache.
+    """
+    server_url = util.REMOTES[remote]["URL"].rstrip("/")
+    cache = cache or {"index": {}, "catalogs": {}}
+
+    old_index = cache["index"]
+    response = simplestreams.fetch(
+        f"{server_url}/{simplestreams.INDEX_PATH}",
+        etag=old_index.get("etag"),
+        last_modified=old_index.get("last_modified")
+    )
+    if response is None:
+        index = old_index
+    else:
+        index = dict(_validators(response),
+                     paths=simplestreams.catalog_paths(response.json()))
+
+    catalogs = {}
+    for path in index["paths"]:
+        old_catalog = cache["catalogs"].get(path, {})
+        response = simplestreams.fetch(
+            f"{server_url}/{path}",
+            etag=old_catalog.get("etag"),
+            last_modified=old_catalog.get("last_modified"),
+            stream=True
+        )
+        if response is None:
+            logging.debug(f"Image catalog {path} has not changed.")
+            catalogs[path] = old_catalog
+            continue
+
+        with response:
+            images = simplestreams.parse_products(
+                simplestreams.text_chunks(response))
+        catalogs[path] = dict(
+            _validators(response),
+            images=list(filter(None, (_compact(remote, i) for i in images)))
+        )
+
+    return {
+        "version": _CACHE_VERSION,
+        "fetched_at": time.time(),
+        "index": index,
+        "catalogs": catalogs,
+    }
+
+
+def _get_cache(remote: str, offline: bool):
+    if remote not in util.REMOTES:
+        raise LXCException(f"Unsupported remote {remote}")
+
+    cache = _load(remote)
+
+    if offline:
+        if cache is None:
+            raise LXCException(
+                f"No cached image list for '{remote}'. Run without --offline first.")
+    elif cache is None or time.time() - cache["fetched_at"] > config.remote_catalog_ttl:
+        try:
+            cache = _refresh(remote, cache)
+            _save(remote, cache)
+        except LXCException as e:
+            if cache is None:
+                raise e
+            logging.warning(f"{e.message}. Using cached image list.")
+
+    return cache
+
+
+def _images(cache: Dict):
+    return [
+        image
+        for catalog in cache["catalogs"].values()
+        for image in catalog["images"]
+    ]
+
+
+def get_images(remote: str, offline=False) -> List[Dict]:
+    """
+    Images available on `remote`, from the cache when it is fresh enough.
+    Each image is a dict with keys alias, aliases, description and fingerprint.
+    - offline: bool
+        Only use the cache. Raises LXCException if there is none.
+    """
+    return _images(_get_cache(remote, offline))
+
+
+class AliasIndex:
+    """
+    Lookup of a remote's images by any of their aliases.
+    """
+
+    def __init__(self, remote: str, images: List[Dict]):
+        self.remote = remote
+        self._images = {}
+        for image in images:
+            for alias in image["aliases"]:
+                self._images.setdefault(alias, image)
+        self._aliases = sorted(self._images)
+
+    def get(self, alias: str) -> Optional[Dict]:
+        return self._images.get(alias)
+
+    def with_prefix(self, prefix: str) -> List[str]:
+        import bisect
+
+        start = bisect.bisect_left(self._aliases, prefix)
+        end = bisect.bisect_left(self._aliases, prefix + "\uffff", lo=start)
+        return self._aliases[start:end]
+
+    def suggest(self, alias: str, count=3) -> List[str]:
+        """
+        Aliases close to `alias`: those that extend it, or else similar ones.
+        """
+        import difflib
+
+        return self.with_prefix(alias)[:count] or \
+            difflib.get_close_matches(alias, self._aliases, n=count)
+
+    def resolve(self, alias: str) -> Dict:
+        """
+        The image for `alias`. Raises LXCException with suggestions if
+        there is none.
+        """
+        image = self.get(alias)
+        if image is None:
+            message = f"Image '{alias}' not found on remote '{self.remote}'."
+            suggestions = self.suggest(alias)
+            if suggestions:
+                message += f" Did you mean {', '.join(suggestions)}?"
+            raise LXCException(message)
+        return image
+
+
+_indexes = {}
+
+
+def get_alias_index(remote: str, offline=False) -> AliasIndex:
+    """
+    AliasIndex over get_images(remote). Built once per catalog download
+    and kept in memory while the catalog is fresh.
+    """
+    fetched_at, index = _indexes.get(remote, (None, None))
+    if index and (offline or time.time() - fetched_at <= config.remote_catalog_ttl):
+        return index
+
+    cache = _get_cache(remote, offline)
+    if fetched_at != cache["fetched_at"]:
+        index = AliasIndex(remote, _images(cache))
+        _indexes[remote] = cache["fetched_at"], index
+    return index
+
+
+# Pull sources ############################################################
+
+
+def _remote_source(remote: str):
+    try:
+        server_url = util.REMOTES[remote]["URL"]
+    except KeyError:
+        raise LXCException(f"Unsupported remote {remote}")
+
+    return {
+        "type": "image",
+        "mode": "pull",
+        "server": server_url,
+        "protocol": "simplestreams"
+    }
+
+
+def resolve_images(remote: str, images: List[str]):
+    """
+    Pull sources for `images` on `remote`, with one catalog lookup. Images
+    are looked up in the catalog so a bad alias fails before anything is
+    pulled, and LXD gets a fingerprint rather than an alias to resolve.
+    Falls back to aliases when the catalog is unavailable.
+
+    Returns (sources, errors): pull sources by image, and an LXCException
+    for each image that is not in the catalog.
+    """
+    source = _remote_source(remote)
+    try:
+        index = get_alias_index(remote)
+    except LXCException as e:
+        logging.debug(e.message)
+        names = ", ".join(f"'{image}'" for image in images)
+        logging.warning(f"Could not check {names} against the catalog.")
+        return {image: dict(source, alias=image) for image in images}, {}
+
+    sources = {}
+    errors = {}
+    for image in images:
+        try:
+            fingerprint = index.resolve(image)["fingerprint"]
+        except LXCException as e:
+            errors[image] = e
+            continue
+
+        if fingerprint:
+            sources[image] = dict(source, fingerprint=fingerprint)
+        else:
+            sources[image] = dict(source, alias=image)
+    return sources, errors
+
+
+def resolve_image(remote: str, image: str):
+    """
+    Pull source for `image` on `remote`. See resolve_images.
+    """
+    sources, errors = resolve_images(remote, [image])
+    if image in errors:
+        raise errors[image]
+    return sources[image]
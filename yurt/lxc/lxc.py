@@ -1,11 +1,12 @@
 import logging
-from typing import List
+from typing import Dict, List
 from pylxd.exceptions import LXDAPIException
 
-from yurt.exceptions import LXCException, VMException
-from yurt import vm
+from yurt.exceptions import LXCException
+from yurt import config
 from yurt import util as yurt_util
-from . import util
+from . import catalog, pool, util
+from .catalog import resolve_image
 
 
 def ensure_is_ready():
@@ -25,73 +26,170 @@ def ensure_is_ready():
     util.check_profile_config()
 
 
-def list_():
-    def get_ipv4_address(instance):
-        ipv4_address = ""
+def _get_ipv4_address(state: Dict):
+    ipv4_address = ""
 
-        state = instance.state()
-        if state.network:
-            try:
-                addresses = state.network["eth0"]["addresses"]
-                ipv4_info = yurt_util.find(
-                    lambda a: a["family"] == "inet", addresses, {}
-                )
-                ipv4_address = ipv4_info.get("address", "")
-            except KeyError as e:
-                logging.debug(f"Missing instance data: {e}")
-
-        return ipv4_address
-
-    def get_image(instance):
-        config = instance.config
+    if state and state.get("network"):
         try:
-            arch, os_, release = config['image.architecture'], config['image.os'], config['image.release']
-            return f"{os_}/{release} ({arch})"
+            addresses = state["network"]["eth0"]["addresses"]
+            ipv4_info = yurt_util.find(
+                lambda a: a["family"] == "inet", addresses, {}
+            )
+            ipv4_address = ipv4_info.get("address", "")
         except KeyError as e:
-            logging.error(e)
-            return ""
+            logging.debug(f"Missing instance data: {e}")
 
-    client = util.get_pylxd_client()
-    instances = []
-    for instance in client.instances.all():  # pylint: disable=no-member
-        instances.append({
-            "Name": instance.name,
-            "Status": instance.status,
-            "IP Address": get_ipv4_address(instance),
-            "Image": get_image(instance)
-        })
+    return ipv4_address
+
+
+def _get_image(instance: Dict):
+    instance_config = instance.get("config", {})
+    try:
+        arch, os_, release = instance_config['image.architecture'], instance_config['image.os'], instance_config['image.release']
+        return f"{os_}/{release} ({arch})"
+    except KeyError as e:
+        logging.error(e)
+        return ""
 
-    return instances
 
+def _fetch_instance_states(instances: List[Dict]):
+    """
+    Fallback for LXD servers that do not include state in recursive listings.
+    """
+    from concurrent.futures import ThreadPoolExecutor
 
-def start(names: List[str]):
-    for name in names:
-        instance = util.get_instance(name)
-        try:
-            instance.start(wait=True)
-        except LXDAPIException as e:
-            raise LXCException(f"Error starting instance: {e}")
+    def fetch_state(instance):
+        response = util.api_request(
+            "GET", f"/instances/{instance['name']}/state")
+        instance["state"] = response.json()["metadata"]
 
+    with ThreadPoolExecutor(max_workers=config.lxd_max_workers) as executor:
+        list(executor.map(fetch_state, instances))
 
-def stop(names: List[str]):
-    for name in names:
-        instance = util.get_instance(name)
-        try:
-            instance.stop(wait=True)
-        except LXDAPIException as e:
-            raise LXCException(f"Error stopping instance: {e}")
 
+@util.reconnect_on_failure
+def list_():
+    try:
+        response = util.api_request(
+            "GET", "/instances", params={"recursion": 2})
+        instances = response.json()["metadata"]
 
-def delete(names: List[str]):
-    for name in names:
-        instance = util.get_instance(name)
+        missing_state = [i for i in instances if "state" not in i]
+        if missing_state:
+            _fetch_instance_states(missing_state)
+    except LXDAPIException as e:
+        logging.debug(e)
+        raise LXCException("Could not fetch instances. API Error.")
+
+    return [
+        {
+            "Name": instance["name"],
+            "Status": instance["status"],
+            "IP Address": _get_ipv4_address(instance["state"]),
+            "Image": _get_image(instance)
+        }
+        for instance in instances
+        if not pool.is_pooled(instance)
+    ]
+
+
+def _for_each_instance(names: List[str], action, max_workers: int, progress_label: str = None,
+                       noun: str = "Instance"):
+    """
+    Run `action` for every instance concurrently, at most `max_workers` at a time.
+    action:         Takes an instance name. Raises on failure.
+    progress_label: If given, show how many instances are done.
+    noun:           What the names refer to, for "<noun> not found." errors.
+
+    Returns one result row per instance. Errors are collected rather than raised.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from threading import Lock
+    from pylxd.exceptions import NotFound
+    import requests
+
+    progress_lock = Lock()
+    done = []
+
+    def report_progress(name):
+        with progress_lock:
+            done.append(name)
+            print(f"\r{progress_label}: {len(done)}/{len(names)}", end="")
+
+    def run(name):
         try:
-            instance.delete(wait=True)
+            action(name)
+            return {"Name": name, "Status": "OK", "Error": ""}
+        except NotFound:
+            error = f"{noun} not found."
         except LXDAPIException as e:
-            raise LXCException(f"Error deleting instance: {e}")
+            error = str(e)
+        except LXCException as e:
+            error = e.message
+        except requests.ConnectionError as e:
+            logging.debug(e)
+            error = "Could not connect to LXD."
+        finally:
+            if progress_label:
+                report_progress(name)
 
+        return {"Name": name, "Status": "Failed", "Error": error}
 
-def launch(remote: str, image: str, name: str):
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run, names))
+
+    if progress_label:
+        print()
+    return results
+
+
+def start(names: List[str], max_workers: int = config.lxd_max_workers):
+    return _for_each_instance(
+        names, lambda name: util.change_state(name, "start"), max_workers)
+
+
+def stop(names: List[str], max_workers: int = config.lxd_max_workers):
+    return _for_each_instance(
+        names, lambda name: util.change_state(name, "stop"), max_workers)
+
+
+def delete(names: List[str], max_workers: int = config.lxd_max_workers):
+    def delete_instance(name):
+        response = util.api_request("DELETE", f"/instances/{name}")
+        util.wait_for_operation(response.json()["operation"])
+
+    return _for_each_instance(names, delete_instance, max_workers)
+
+
+def _create_from_remote(source: Dict, name: str):
+    """
+    Create an instance from a remote image, pulling the image into LXD's
+    image store with progress shown. Returns the image's fingerprint.
+    """
+    logging.info(
+        f"Launching container '{name}'. This might take a few minutes...")
+    operation = util.create_instance(name, source)
+    util.follow_operation(
+        operation,
+        unpack_metadata=util.unpack_download_operation_metadata
+    )
+
+    response = util.api_request("GET", f"/instances/{name}")
+    return response.json()["metadata"]["config"]["volatile.base_image"]
+
+
+def launch_many(remote: str, image: str, names: List[str], max_workers: int = config.lxd_max_workers,
+                source: Dict = None):
+    """
+    Create and start containers from one image.
+    The image is resolved and pulled once. The remaining containers are
+    created from the local copy, concurrently. If the image has a warm pool,
+    pooled containers are used first. See pool.py.
+    - source: Dict
+        Result of resolve_image(remote, image), if already known.
+
+    Returns one result row per container.
+    """
     # https://linuxcontainers.org/lxd/docs/master/instances
     # Valid instance names must:
     #   - Be between 1 and 63 characters long
@@ -99,37 +197,79 @@ def launch(remote: str, image: str, name: str):
     #   - Not start with a digit or a dash
     #   - Not end with a dash
 
-    client = util.get_pylxd_client()
-    try:
-        server_url = util.REMOTES[remote]["URL"]
-    except KeyError:
-        raise LXCException(f"Unsupported remote {remote}")
+    claimed = []
+    if remote == pool.REMOTE and image in pool.get_sizes():
+        claimed = pool.claim(image, names)
+        pool.fill_in_background(image)
+
+    to_create = [name for name in names if name not in claimed]
+    create_error = None
+    if to_create:
+        source = source or resolve_image(remote, image)
+        first = to_create[0]
+        try:
+            fingerprint = _create_from_remote(source, first)
+        except (LXDAPIException, LXCException, KeyError) as e:
+            # Claimed containers are still started below.
+            logging.debug(e)
+            error = e.message if isinstance(e, LXCException) else str(e)
+            create_error = LXCException(f"Could not create from {image}: {error}")
+
+    def launch_instance(name):
+        if name in to_create:
+            if create_error:
+                raise create_error
+            if name != first:
+                util.wait_for_operation(util.create_instance(name, {
+                    "type": "image",
+                    "fingerprint": fingerprint
+                }))
+        util.change_state(name, "start")
+
+    if len(names) > 1:
+        logging.info(f"Launching {len(names)} containers...")
+        progress_label = "Launched"
+    else:
+        logging.info("Starting container")
+        progress_label = None
+
+    return _for_each_instance(
+        names, launch_instance, max_workers, progress_label)
+
+
+def clone(source: str, names: List[str], max_workers: int = config.lxd_max_workers):
+    """
+    Create and start containers as copies of the container `source`.
+    On yurt's ZFS storage pool, copies are snapshot clones and take well
+    under a second to create. Snapshots of `source` are not copied.
+
+    Returns one result row per container.
+    """
+    from pylxd.exceptions import NotFound
 
     try:
-        logging.info(
-            f"Launching container '{name}'. This might take a few minutes...")
-        response = client.api.instances.post(json={
-            "name": name,
-            "profiles": [util.PROFILE_NAME],
-            "source": {
-                "type": "image",
-                "alias": image,
-                "mode": "pull",
-                "server": server_url,
-                "protocol": "simplestreams"
-            }
-        })
+        util.api_request("GET", f"/instances/{source}")
+    except NotFound:
+        raise LXCException(f"Instance {source} not found.")
 
-        util.follow_operation(
-            response.json()["operation"],
-            unpack_metadata=util.unpack_download_operation_metadata
-        )
+    def clone_instance(name):
+        util.wait_for_operation(util.create_instance(name, {
+            "type": "copy",
+            "source": source,
+            "instance_only": True
+        }))
+        util.change_state(name, "start")
 
-        logging.info(f"Starting container")
-        instance = util.get_instance(name)
-        instance.start(wait=True)
-    except LXDAPIException as e:
-        logging.error(e)
+    logging.info(f"Creating {len(names)} container(s) from '{source}'...")
+    return _for_each_instance(
+        names, clone_instance, max_workers,
+        "Created" if len(names) > 1 else None)
+
+
+def launch(remote: str, image: str, name: str):
+    results = launch_many(remote, image, [name])
+    if results[0]["Status"] != "OK":
+        logging.error(results[0]["Error"])
         raise LXCException(f"Failed to launch instance {name}")
 
 
@@ -144,36 +284,71 @@ def shell(instance_name: str):
     })
 
 
-def list_remote_images(remote: str):
-    from functools import partial
-    import json
-
+def list_remote_images(remote: str, offline=False):
     try:
-        # We'd have to implement simplestreams ourselves as this call is handled
-        # entirely by the client. Let's cheat.
-        output, error = vm.run_cmd(
-            f"lxc image list {remote}: --format json", show_spinner=True)
-        if error:
-            logging.error(error)
-
-        images = util.filter_remote_images(json.loads(output))
-
-        images_info = filter(
-            None,
-            map(partial(util.get_remote_image_info, remote), images)
-        )
-
-        if remote == "ubuntu":
-            return sorted(images_info, key=lambda i: i["Alias"], reverse=True)
-        else:
-            return sorted(images_info, key=lambda i: i["Alias"])
-
-    except VMException as e:
+        images = catalog.get_images(remote, offline=offline)
+    except LXCException as e:
         message = f"Could not fetch remote images: {e.message}"
-        logging.error("Please confirm that you're connected to the internet.")
+        if not offline:
+            logging.error(
+                "Please confirm that you're connected to the internet.")
         raise LXCException(message)
 
+    images_info = [
+        {"Alias": image["alias"], "Description": image["description"]}
+        for image in images
+    ]
+
+    if remote == "ubuntu":
+        return sorted(images_info, key=lambda i: i["Alias"], reverse=True)
+    else:
+        return sorted(images_info, key=lambda i: i["Alias"])
+
+
+def pull_images(remote: str, images: List[str], auto_update=False,
+                max_workers: int = config.lxd_max_workers):
+    """
+    Import images from `remote` into LXD's image store so that later
+    launches do not have to download them. Images that are already in the
+    store are skipped.
+    - auto_update: bool
+        Let LXD keep the imported images up to date.
+
+    Returns one result row per image.
+    """
+    from pylxd.exceptions import NotFound
+
+    # Resolve every image up front, with one catalog lookup, rather than
+    # have each worker fetch and parse the catalog.
+    sources, errors = catalog.resolve_images(remote, images)
+
+    def pull(image):
+        if image in errors:
+            raise errors[image]
+        pull_source = dict(sources[image])
+
+        fingerprint = pull_source.pop("fingerprint", None)
+        if fingerprint:
+            try:
+                util.api_request("GET", f"/images/{fingerprint}")
+                logging.debug(f"Image {image} is already in the image store.")
+                return
+            except NotFound:
+                pass
+
+        # Pull by alias so LXD can track it for auto updates.
+        pull_source.pop("mode")
+        response = util.api_request("POST", "/images", json={
+            "auto_update": auto_update,
+            "source": dict(pull_source, alias=image)
+        })
+        util.wait_for_operation(response.json()["operation"])
+
+    logging.info(f"Pulling {len(images)} image(s)...")
+    return _for_each_instance(images, pull, max_workers, "Pulled", noun="Image")
+
 
+@util.reconnect_on_failure
 def list_cached_images():
     def get_cached_image_info(image):
         try:
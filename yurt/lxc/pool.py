@@ -0,0 +1,186 @@
+"""
+Warm pools of stopped containers, created ahead of time per image.
+
+Pool members are named POOL_PREFIX-<random> and record their image in the
+POOL_CONFIG_KEY instance config key. A launch from a pooled image claims a
+member by renaming it, which LXD does atomically, and the pool is refilled
+in the background.
+"""
+import logging
+from typing import Dict, List
+
+from pylxd.exceptions import LXDAPIException, NotFound
+
+from yurt import config
+from yurt.exceptions import LXCException
+from . import catalog, util
+
+
+REMOTE = "images"
+POOL_PREFIX = "yurt-pool"
+POOL_CONFIG_KEY = "user.yurt.pool"
+
+
+def is_pooled(instance: Dict):
+    """
+    Whether an instance, as listed by LXD, is an unclaimed pool member.
+    """
+    return bool(instance.get("config", {}).get(POOL_CONFIG_KEY))
+
+
+def get_sizes() -> Dict[str, int]:
+    return config.get_config(config.Key.warm_pools) or {}
+
+
+def set_size(image: str, size: int):
+    with config.transaction() as updates:
+        sizes = get_sizes()
+        if size > 0:
+            sizes[image] = size
+        else:
+            sizes.pop(image, None)
+        updates[config.Key.warm_pools] = sizes
+
+
+def get_stats() -> Dict[str, Dict[str, int]]:
+    return config.get_config(config.Key.warm_pool_stats) or {}
+
+
+def _record_stats(image: str, hits: int, misses: int):
+    with config.transaction() as updates:
+        stats = get_stats()
+        image_stats = stats.setdefault(image, {"hits": 0, "misses": 0})
+        image_stats["hits"] += hits
+        image_stats["misses"] += misses
+        updates[config.Key.warm_pool_stats] = stats
+
+
+def _members() -> Dict[str, List[str]]:
+    """
+    Names of stopped pool members, by image.
+    """
+    response = util.api_request(
+        "GET", "/instances", params={"recursion": 1})
+
+    members = {}
+    for instance in response.json()["metadata"]:
+        image = instance["config"].get(POOL_CONFIG_KEY)
+        if is_pooled(instance) and instance["status"] == "Stopped":
+            members.setdefault(image, []).append(instance["name"])
+    return members
+
+
+def claim(image: str, names: List[str]) -> List[str]:
+    """
+    Take over pool members of `image` for as many of `names` as possible.
+    Claimed containers are renamed but not started.
+
+    Returns the names that were claimed.
+    """
+    if image not in get_sizes():
+        return []
+
+    available = _members().get(image, [])
+
+    def claim_one(name):
+        """
+        True if a member was renamed to `name`, False if the pool ran out.
+        """
+        while available:
+            member = available.pop()
+            try:
+                response = util.api_request(
+                    "POST", f"/instances/{member}", json={"name": name})
+            except NotFound:
+                # Already claimed by another launch.
+                logging.debug(f"{member} was claimed by another launch.")
+                continue
+
+            util.wait_for_operation(response.json()["operation"])
+            util.api_request("PATCH", f"/instances/{name}", json={
+                "config": {POOL_CONFIG_KEY: ""}})
+            return True
+        return False
+
+    claimed = []
+    misses = 0
+    try:
+        for name in names:
+            if claim_one(name):
+                claimed.append(name)
+            else:
+                misses += 1
+    except (LXDAPIException, LXCException) as e:
+        # e.g. the name is taken. The remaining names are created as usual,
+        # which reports such errors per name.
+        logging.debug(f"Stopped claiming from the {image} pool: {e}")
+
+    _record_stats(image, hits=len(claimed), misses=misses)
+    logging.debug(f"Claimed {len(claimed)} of {len(names)} from the {image} pool.")
+    return claimed
+
+
+def fill(images: List[str] = None):
+    """
+    Create or delete pool members until each pool has its configured size.
+    New members are booted once and stopped, so that first boot setup is done.
+    - images: List[str]
+        Pools to fill. All pools by default.
+    """
+    from yurt.util import file_lock
+
+    # One fill at a time, or concurrent launches would each top up the pools.
+    with file_lock(config.pool_lock_file):
+        sizes = get_sizes()
+        members = _members()
+
+        for image in images or list(sizes):
+            _fill(image, sizes.get(image, 0), members.get(image, []))
+
+
+def _fill(image: str, size: int, current: List[str]):
+    from yurt.util import random_string
+
+    for name in current[size:]:
+        logging.info(f"Removing {name} from the {image} pool.")
+        response = util.api_request("DELETE", f"/instances/{name}")
+        util.wait_for_operation(response.json()["operation"])
+
+    missing = size - len(current)
+    if missing <= 0:
+        return
+
+    source = catalog.resolve_image(REMOTE, image)
+    for _ in range(missing):
+        name = f"{POOL_PREFIX}-{random_string(8)}"
+        logging.info(f"Adding {name} to the {image} pool.")
+        try:
+            util.wait_for_operation(util.create_instance(
+                name, source, instance_config={POOL_CONFIG_KEY: image}))
+            util.change_state(name, "start")
+            util.change_state(name, "stop")
+        except (LXDAPIException, LXCException) as e:
+            raise LXCException(f"Failed to fill the {image} pool: {e}")
+
+
+def fill_in_background(image: str):
+    from yurt.util import spawn_detached, yurt_command
+
+    spawn_detached(yurt_command("pool", "fill", "--background", image))
+
+
+def status():
+    sizes = get_sizes()
+    stats = get_stats()
+    members = _members()
+
+    return [
+        {
+            "Image": image,
+            "Size": sizes.get(image, 0),
+            "Ready": len(members.get(image, [])),
+            "Hits": stats.get(image, {}).get("hits", 0),
+            "Misses": stats.get(image, {}).get("misses", 0),
+        }
+        for image in sorted(set(sizes) | set(members))
+    ]
@@ -0,0 +1,223 @@
+"""
+Read image catalogs from simplestreams servers such as
+https://images.linuxcontainers.org without going through the VM.
+
+Product catalogs are several megabytes of JSON. They are parsed as they
+download, one product at a time, and only container images for
+ARCHITECTURE are kept.
+"""
+import json
+import logging
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from yurt.exceptions import LXCException
+
+
+INDEX_PATH = "streams/v1/index.json"
+ARCHITECTURE = "amd64"
+LXD_ARCHITECTURE = "x86_64"
+
+_CHUNK_SIZE = 64 * 1024
+_CONTAINER_FTYPES = {"squashfs", "root.tar.xz"}
+_FINGERPRINT_KEYS = [
+    "combined_squashfs_sha256",
+    "combined_rootxz_sha256",
+    "combined_sha256",
+]
+
+
+class _StreamingParser:
+    """
+    Incrementally parses a JSON document from text chunks.
+    Only as much of the document as is needed for the current value is buffered.
+    """
+
+    _WHITESPACE = " \t\n\r"
+
+    def __init__(self, chunks: Iterable[str]):
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._eof = True
+            return False
+
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buffer) and \
+                    self._buffer[self._pos] in self._WHITESPACE:
+                self._pos += 1
+
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+
+            if not self._fill():
+                raise LXCException("Unexpected end of simplestreams data.")
+
+    def _expect(self, *tokens: str):
+        token = self._peek()
+        if token not in tokens:
+            raise LXCException(
+                f"Malformed simplestreams data. Expected {tokens}, got {token!r}.")
+        self._pos += 1
+        return token
+
+    def value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number at the end of the buffer may continue in the next chunk.
+                if end < len(self._buffer) or self._eof or \
+                        not isinstance(value, (int, float)) or not self._fill():
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if not self._fill():
+                    raise LXCException(f"Malformed simplestreams data: {e}")
+
+    def object_items(self) -> Iterator[Tuple[str, "_StreamingParser"]]:
+        """
+        Iterate over an object's keys. The consumer must read each key's value,
+        with value() or a nested object_items(), before advancing.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self.value()
+            self._expect(":")
+            yield key, self
+            if self._expect(",", "}") == "}":
+                return
+
+
+def _iter_products(chunks: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+    parser = _StreamingParser(chunks)
+    for key, _ in parser.object_items():
+        if key == "products":
+            for name, _ in parser.object_items():
+                yield name, parser.value()
+        else:
+            parser.value()
+
+
+def _latest_version(product: Dict):
+    versions = product.get("versions") or {}
+    if not versions:
+        return None, {}
+
+    serial = max(versions)
+    return serial, versions[serial].get("items") or {}
+
+
+def _to_image(product: Dict):
+    """
+    LXD-style image record for a product, or None if it is not an
+    aliased container image for ARCHITECTURE.
+    """
+    if product.get("arch") != ARCHITECTURE or not product.get("aliases"):
+        return None
+
+    serial, items = _latest_version(product)
+    ftypes = {item.get("ftype") for item in items.values()}
+    if not ftypes & _CONTAINER_FTYPES:
+        return None
+
+    metadata = items.get("lxd.tar.xz", {})
+    fingerprint = next(
+        (metadata[k] for k in _FINGERPRINT_KEYS if k in metadata), None)
+
+    os_ = product.get("os", "")
+    release_title = product.get("release_title") or product.get("release", "")
+
+    return {
+        "aliases": [{"name": a} for a in product["aliases"].split(",") if a],
+        "architecture": LXD_ARCHITECTURE,
+        "type": "container",
+        "fingerprint": fingerprint,
+        "properties": {
+            "os": os_,
+            "release": product.get("release", ""),
+            "serial": serial,
+            "description": f"{os_} {release_title} {ARCHITECTURE} ({serial})",
+        },
+    }
+
+
+def parse_products(chunks: Iterable[str]) -> List[Dict]:
+    """
+    Container images for ARCHITECTURE in a product catalog.
+    chunks: The catalog's text, in pieces of any size.
+    """
+    images = []
+    for name, product in _iter_products(chunks):
+        image = _to_image(product)
+        if image:
+            images.append(image)
+        else:
+            logging.debug(f"Skipping product {name}")
+
+    return images
+
+
+def catalog_paths(index: Dict):
+    """
+    Paths of the image catalogs listed in a server's index.
+    """
+    return [
+        entry["path"]
+        for entry in index.get("index", {}).values()
+        if entry.get("datatype") == "image-downloads" and "path" in entry
+    ]
+
+
+def fetch(url: str, etag: str = None, last_modified: str = None, stream=False):
+    """
+    GET a simplestreams document.
+    Returns None if the server reports that it has not changed since the
+    response that `etag` and `last_modified` came from.
+    """
+    import requests
+
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    try:
+        response = requests.get(
+            url, headers=headers, timeout=30, stream=stream)
+        if response.status_code == 304:
+            response.close()
+            return None
+        response.raise_for_status()
+        return response
+    except requests.RequestException as e:
+        logging.debug(e)
+        raise LXCException(f"Could not fetch {url}")
+
+
+def text_chunks(response):
+    """
+    Decoded text of a streamed response, as it downloads.
+    """
+    import codecs
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
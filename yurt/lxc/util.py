@@ -1,15 +1,21 @@
 import logging
 import os
-from typing import List, Dict
+import re
+from typing import TYPE_CHECKING, List, Dict
 import pylxd
 
 from yurt import config
-from yurt import vm
+from yurt.vm import provision
 from yurt.exceptions import LXCException, VMException
 
+if TYPE_CHECKING:
+    import requests
+
 
 NETWORK_NAME = "yurt-int"
 PROFILE_NAME = "yurt"
+OPERATION_PROGRESS_INTERVAL = 1  # seconds
+_UBUNTU_RELEASE_ALIAS = re.compile(r"^\d\d\.\d\d")
 REMOTES = {
     "images": {
         "Name": "images",
@@ -22,30 +28,215 @@ REMOTES = {
 }
 
 
-def _setup_yurt_socat():
-    name = "yurt-lxd-socat"
-    vm.run_cmd("mkdir -p /tmp/yurt")
-    tmp_unit_file = f"/tmp/yurt/{name}.service"
-    installed_unit_file = f"/etc/systemd/system/{name}.service"
-    vm.run_cmd("sudo apt install socat -y")
-    vm.put_file(os.path.join(config.provision_dir,
-                             f"{name}.service"), tmp_unit_file)
-    vm.run_cmd(f"sudo cp {tmp_unit_file} {installed_unit_file}")
-    vm.run_cmd("sudo systemctl daemon-reload")
-    vm.run_cmd(f"sudo systemctl enable {name}")
-    vm.run_cmd(f"sudo systemctl start {name}")
+def _read_provision_file(name: str):
+    try:
+        with open(os.path.join(config.provision_dir, name), "r") as f:
+            return f.read()
+    except OSError as e:
+        raise LXCException(f"Error reading {name} {e}")
+
+
+def _provisioning_steps():
+    socat_service = "yurt-lxd-socat"
+
+    return [
+        provision.Step(
+            "apt-update",
+            "Updating package information",
+            "apt update"
+        ),
+        provision.Step(
+            "lxd-group",
+            "Adding user to the lxd group",
+            f"usermod {config.user_name} -a -G lxd"
+        ),
+        provision.Step(
+            "lxd-init",
+            "Initializing LXD",
+            provision.heredoc(
+                "lxd init --preseed",
+                _read_provision_file("lxd-init.yaml")
+            )
+        ),
+        provision.Step(
+            "socat-install",
+            "Installing socat",
+            "apt install socat -y"
+        ),
+        provision.Step(
+            "socat-service",
+            "Setting up the LXD proxy service",
+            "\n".join([
+                provision.write_file(
+                    f"/etc/systemd/system/{socat_service}.service",
+                    _read_provision_file(f"{socat_service}.service")
+                ),
+                "systemctl daemon-reload",
+                f"systemctl enable {socat_service}",
+                f"systemctl start {socat_service}",
+            ])
+        ),
+    ]
+
+
+# LXD endpoint => shared keep-alive HTTP session / client.
+# Clients are created on first use so that commands which only need
+# api_request never pay for pylxd's host info request.
+_sessions: Dict[str, "requests.Session"] = {}
+_clients: Dict[str, pylxd.Client] = {}
+
+
+def _endpoint():
+    lxd_port = config.get_config(config.Key.lxd_port)
+    return f"http://127.0.0.1:{lxd_port}"
+
+
+def _get_session(endpoint: str):
+    import requests
+
+    session = _sessions.get(endpoint)
+    if session is None:
+        session = requests.Session()
+        _sessions[endpoint] = session
+    return session
 
 
 def get_pylxd_client():
-    lxd_port = config.get_config(config.Key.lxd_port)
+    """
+    The pylxd client for the current endpoint, on the shared session.
+    pylxd fetches host info when a client is built, and cannot defer it, so
+    this costs one request per process for the commands that need a client.
+    """
+    endpoint = _endpoint()
+    client = _clients.get(endpoint)
+    if client:
+        return client
+
     try:
-        return pylxd.Client(endpoint=f"http://127.0.0.1:{lxd_port}")
+        try:
+            client = pylxd.Client(
+                endpoint=endpoint, session=_get_session(endpoint))
+        except TypeError:
+            # pylxd < 2.3 manages its own sessions.
+            client = pylxd.Client(endpoint=endpoint)
     except pylxd.exceptions.ClientConnectionFailed as e:
         logging.debug(e)
         raise LXCException(
             "Error connecting to LXD. Try restarting the VM: 'yurt vm restart'")
 
+    _clients[endpoint] = client
+    return client
+
+
+def reset_pylxd_client():
+    """
+    Drop cached clients and close their connections.
+    """
+    for session in _sessions.values():
+        session.close()
+    _sessions.clear()
+    _clients.clear()
+
+
+def reconnect_on_failure(fn):
+    """
+    Retry `fn` once on a fresh connection if the cached one failed.
+    """
+    from functools import wraps
+    import requests
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except requests.ConnectionError as e:
+            logging.debug(f"LXD connection failed: {e}. Reconnecting...")
+            reset_pylxd_client()
+
+        try:
+            return fn(*args, **kwargs)
+        except requests.ConnectionError as e:
+            logging.debug(e)
+            raise LXCException(
+                "Error connecting to LXD. Try restarting the VM: 'yurt vm restart'")
+
+    return wrapper
+
+
+def api_request(method: str, path: str, **kwargs):
+    """
+    Call the LXD REST API over the shared session.
+    - path: str
+        Relative to /1.0, e.g. "/instances".
+    Returns the requests.Response. Raises pylxd's API exceptions on errors,
+    like pylxd's own calls do.
+    """
+    endpoint = _endpoint()
+    response = _get_session(endpoint).request(
+        method, f"{endpoint}/1.0{path}", **kwargs)
+
+    if response.status_code == 404:
+        raise pylxd.exceptions.NotFound(response)
+    if response.status_code >= 400:
+        raise pylxd.exceptions.LXDAPIException(response)
+
+    return response
+
+
+def operation_path(operation_uri: str):
+    """
+    "/1.0/operations/<id>" => "/operations/<id>", for use with api_request.
+    """
+    return operation_uri[len("/1.0"):] if operation_uri.startswith("/1.0/") \
+        else operation_uri
+
+
+def _check_operation(operation: Dict):
+    """
+    Raise LXCException if a finished operation did not succeed.
+    """
+    if operation["status_code"] >= 400:
+        raise LXCException(operation.get("err") or operation["status"])
+    return operation
+
+
+def wait_for_operation(operation_uri: str):
+    """
+    Block until an operation is done. Raises LXCException if it failed.
+    """
+    response = api_request(
+        "GET", f"{operation_path(operation_uri)}/wait")
+    return _check_operation(response.json()["metadata"])
 
+
+def create_instance(name: str, source: Dict, instance_config: Dict = None):
+    """
+    Start creating an instance with yurt's profile.
+    Returns the operation URI.
+    """
+    response = api_request("POST", "/instances", json={
+        "name": name,
+        "profiles": [PROFILE_NAME],
+        "config": instance_config or {},
+        "source": source
+    })
+    return response.json()["operation"]
+
+
+def change_state(name: str, action: str):
+    """
+    Change an instance's state and wait until it is done.
+    - action: str
+        e.g. "start" or "stop".
+    """
+    response = api_request(
+        "PUT", f"/instances/{name}/state",
+        json={"action": action, "timeout": 30}
+    )
+    wait_for_operation(response.json()["operation"])
+
+
+@reconnect_on_failure
 def get_instance(name: str):
     client = get_pylxd_client()
     try:
@@ -88,33 +279,20 @@ def initialize_lxd():
     if is_initialized():
         return
 
-    try:
-        with open(os.path.join(config.provision_dir, "lxd-init.yaml"), "r") as f:
-            init = f.read()
-    except OSError as e:
-        raise LXCException(f"Error reading lxd-init.yaml {e}")
+    steps = _provisioning_steps()
 
     try:
-        logging.info("Updating package information...")
-        vm.run_cmd("sudo apt update", show_spinner=True)
-        vm.run_cmd("sudo usermod yurt -a -G lxd")
-
-        logging.info("Initializing LXD...")
-        vm.run_cmd(
-            "sudo lxd init --preseed",
-            stdin=init,
-            show_spinner=True
-        )
-        _setup_yurt_socat()
+        provision.run("lxd", steps)
 
         logging.info("Done.")
         config.set_config(config.Key.is_lxd_initialized, True)
     except VMException as e:
-        logging.error(e)
+        logging.error(e.message)
         logging.error("Restart the VM to try again: 'yurt vm restart'")
         raise LXCException("Failed to initialize LXD.")
 
 
+@reconnect_on_failure
 def check_network_config():
     client = get_pylxd_client()
     if client.networks.exists(NETWORK_NAME):  # pylint: disable=no-member
@@ -140,6 +318,35 @@ def check_network_config():
         })
 
 
+def get_readiness_fingerprint(timeout: float = 5):
+    """
+    Values that change when LXD in the VM is restarted or replaced, or when
+    yurt's network or profile is changed or removed. Costs three requests
+    on the shared session, no SSH.
+    Raises LXCException if LXD does not answer or either is missing.
+    """
+    import requests
+
+    try:
+        response = api_request("GET", "", timeout=timeout)
+        environment = response.json()["metadata"]["environment"]
+        network = api_request("GET", f"/networks/{NETWORK_NAME}", timeout=timeout)
+        profile = api_request("GET", f"/profiles/{PROFILE_NAME}", timeout=timeout)
+    except (requests.RequestException, pylxd.exceptions.LXDAPIException) as e:
+        logging.debug(e)
+        raise LXCException("LXD network or profile is not configured.")
+
+    return {
+        # Identifies the LXD installation, and so the VM.
+        "certificate_fingerprint": environment.get("certificate_fingerprint"),
+        # Changes when LXD restarts, including on VM reboots.
+        "server_pid": environment.get("server_pid"),
+        "lxd_network_etag": network.headers.get("ETag"),
+        "lxd_profile_etag": profile.headers.get("ETag"),
+    }
+
+
+@reconnect_on_failure
 def check_profile_config():
     client = get_pylxd_client()
     if client.profiles.exists(PROFILE_NAME):  # pylint: disable=no-member
@@ -164,44 +371,14 @@ def check_profile_config():
     )
 
 
-def shortest_alias(aliases: List[Dict[str, str]], remote: str):
-    import re
-
-    aliases = list(map(lambda a: str(a["name"]), aliases))
+def shortest_alias(aliases: List[str], remote: str):
     if remote == "ubuntu":
-        aliases = list(filter(lambda a: re.match(
-            r"^\d\d\.\d\d", a), aliases))
-
-    try:
-        alias = aliases[0]
-        for a in aliases:
-            if len(a) < len(alias):
-                alias = a
-        return alias
-    except (IndexError, KeyError) as e:
-        logging.debug(e)
-        logging.error(f"Unexpected alias schema: {aliases}")
-
-
-def filter_remote_images(images: List[Dict]):
-    aliased = filter(lambda i: i["aliases"],  images)
-    container = filter(
-        lambda i: i["type"] == "container", aliased)
-    x64 = filter(
-        lambda i: i["architecture"] == "x86_64", container)
+        aliases = [a for a in aliases if _UBUNTU_RELEASE_ALIAS.match(a)]
 
-    return x64
-
-
-def get_remote_image_info(remote: str, image: Dict):
-    try:
-        return {
-            "Alias": shortest_alias(image["aliases"], remote),
-            "Description": image["properties"]["description"]
-        }
-    except KeyError as e:
-        logging.debug(e)
-        logging.debug(f"Unexpected image schema: {image}")
+    if not aliases:
+        logging.debug("No usable alias in image.")
+        return None
+    return min(aliases, key=len)
 
 
 def exec_interactive(instance_name: str, cmd: List[str], environment=None):
@@ -224,46 +401,44 @@ def unpack_download_operation_metadata(metadata):
             return f"Download progress: {metadata['download_progress']}"
         if "create_instance_from_image_unpack_progress" in metadata:
             return f"Unpack progress: {metadata['create_instance_from_image_unpack_progress']}"
-    else:
-        return ""
+
+    return ""
 
 
 def follow_operation(operation_uri: str, unpack_metadata=None):
     """
+    Wait for an operation to finish, showing its progress as LXD reports it.
+
     Params:
         operation_uri:      URI of the operation to follow.
         unpack_metadata:    Function to unpack the operation's metadata. Return a line of text to summarize
                             the current progress of the operation.
                             If not given, progress will not be shown.
-    """
-    import time
-    from yurt.util import retry
 
-    operations = get_pylxd_client().operations
+    Returns the finished operation. Raises LXCException if it failed or was cancelled.
+    """
+    path = operation_path(operation_uri)
 
-    # Allow time for operation to be created.
     try:
-        retry(
-            lambda: operations.get(operation_uri),  # pylint: disable=no-member
-            retries=10,
-            wait_time=0.5
-        )
-        operation = operations.get(operation_uri)  # pylint: disable=no-member
-    except pylxd.exceptions.NotFound:
-        raise LXCException(
-            f"Timed out while waiting for operation to be created.")
-
-    logging.info(operation.description)
-    while True:
-        try:
-            operation = operations.get(  # pylint: disable=no-member
-                operation_uri
+        operation = api_request("GET", path).json()["metadata"]
+        logging.info(operation["description"])
+
+        # Status codes below 200 are in progress. The wait endpoint returns as
+        # soon as the operation finishes, or with its current state on timeout.
+        while operation["status_code"] < 200:
+            response = api_request(
+                "GET", f"{path}/wait",
+                params={"timeout": OPERATION_PROGRESS_INTERVAL}
             )
+            operation = response.json()["metadata"]
             if unpack_metadata:
-                print(f"\r{unpack_metadata(operation.metadata)}", end="")
-            time.sleep(0.5)
-        except pylxd.exceptions.NotFound:
-            print("\nDone")
-            break
-        except KeyboardInterrupt:
-            break
+                print(f"\r{unpack_metadata(operation['metadata'])}", end="")
+    except pylxd.exceptions.NotFound:
+        raise LXCException(f"Operation {operation_uri} not found.")
+    except KeyboardInterrupt:
+        raise LXCException("Interrupted. The operation continues in LXD.")
+    finally:
+        if unpack_metadata:
+            print()
+
+    return _check_operation(operation)
@@ -1,56 +1,350 @@
 import logging
 import os
+import threading
+from contextlib import contextmanager
 from typing import List
 
 from yurt.exceptions import CommandException, CommandTimeout, YurtException
 
 
-def download_file(url: str, destination: str, show_progress=False):
-    import shutil
+_IO_CHUNK_SIZE = 1024 * 1024
+# Small reads keep segment downloads quick to cancel.
+_SEGMENT_READ_SIZE = 64 * 1024
+
+
+def _hash_file(file_path: str, hash_):
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(_IO_CHUNK_SIZE), b""):
+            hash_.update(block)
+    return hash_
+
+
+def _transient_errors():
+    import requests
+
+    return (requests.ConnectionError, requests.Timeout,
+            requests.exceptions.ChunkedEncodingError)
+
+
+def _download_stream(url: str, part_file: str, show_progress: bool, retries: int, retry_wait: float):
+    """
+    Download over one connection, appending to `part_file`.
+    Returns the SHA-256 hash object of the file.
+    """
+    import hashlib
+    import time
+    from contextlib import nullcontext
 
     import requests
     from click import progressbar
 
+    if os.path.isfile(part_file):
+        logging.debug(f"Resuming download into {part_file}")
+        hash_ = _hash_file(part_file, hashlib.sha256())
+    else:
+        hash_ = hashlib.sha256()
+        open(part_file, "wb").close()
+
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part_file)
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=30) as r:
+                if r.status_code == 416:
+                    # Nothing past the end of the .part file. It is complete
+                    # if it is as long as the file on the server.
+                    _, _, length = r.headers.get("content-range", "").partition("/")
+                    if length.isdigit() and int(length) == offset:
+                        return hash_
+                    logging.debug("The .part file does not match the server's. Restarting.")
+                    open(part_file, "wb").close()
+                    hash_ = hashlib.sha256()
+                    continue
+                r.raise_for_status()
+                if r.status_code != 206 and offset:
+                    logging.debug("Server ignored the Range request. Restarting.")
+                    offset = 0
+                    hash_ = hashlib.sha256()
+
+                content_length = r.headers.get("content-length")
+                total_bytes = offset + int(content_length) if content_length else None
+                received = offset
+
+                progress = progressbar(length=total_bytes) \
+                    if total_bytes and show_progress else nullcontext()
+
+                with open(part_file, "r+b") as f, progress as bar:
+                    f.seek(offset)
+                    f.truncate()
+                    if bar:
+                        bar.update(offset)
+
+                    for chunk in r.iter_content(chunk_size=_IO_CHUNK_SIZE):
+                        f.write(chunk)
+                        hash_.update(chunk)
+                        received += len(chunk)
+                        if bar:
+                            bar.update(len(chunk))
+
+                if total_bytes is None or received >= total_bytes:
+                    return hash_
+                raise requests.ConnectionError(
+                    f"Connection closed after {received} of {total_bytes} bytes")
+
+        except _transient_errors() as e:
+            logging.debug(e)
+            attempt += 1
+            if attempt > retries:
+                raise YurtException(
+                    "Download interrupted. Run the command again to resume it.")
+            logging.info("Download interrupted. Resuming...")
+            time.sleep(retry_wait)
+
+
+def _range_length(url: str):
+    """
+    Size of the file at `url` if the server accepts byte range requests.
+    """
+    import requests
+
     try:
-        with requests.get(url, stream=True) as r:
-            with open(destination, 'wb') as f:
-                total_bytes = r.headers.get("content-length")
-
-                if total_bytes is None or not show_progress:
-                    shutil.copyfileobj(r.raw, f)
-                else:
-                    with progressbar(length=int(total_bytes)) as bar:
-                        for chunk in r.iter_content(chunk_size=4096):
+        r = requests.head(url, allow_redirects=True, timeout=30)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        # Some servers reject HEAD but serve GET just fine.
+        logging.debug(f"HEAD request failed: {e}")
+        return None
+
+    content_length = r.headers.get("content-length")
+    if r.headers.get("accept-ranges", "").lower() != "bytes" or not content_length:
+        return None
+    return int(content_length)
+
+
+class _RangeNotHonored(Exception):
+    """
+    A range request was answered with the whole file.
+    """
+
+
+def _download_segments(url: str, segments_file: str, total_bytes: int, connections: int,
+                       show_progress: bool, retries: int, retry_wait: float):
+    """
+    Download byte ranges of `url` on several connections into a preallocated
+    `segments_file`. Each segment is written in place and retried on its own.
+    Returns the SHA-256 hash object of the file.
+    """
+    import hashlib
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from contextlib import nullcontext
+    from threading import Event, Lock
+
+    import requests
+    from click import progressbar
+
+    connections = max(1, min(connections, total_bytes // _IO_CHUNK_SIZE))
+    segment_size = -(-total_bytes // connections)
+    segments = [
+        (start, min(start + segment_size, total_bytes) - 1)
+        for start in range(0, total_bytes, segment_size)
+    ]
+    logging.debug(f"Downloading {len(segments)} segments of {segment_size} bytes")
+
+    with open(segments_file, "wb") as f:
+        f.truncate(total_bytes)
+
+    progress_lock = Lock()
+    progress = progressbar(length=total_bytes) if show_progress else nullcontext()
+    # Set on the first failure or interrupt so the other segments stop early.
+    cancelled = Event()
+
+    def fetch_segment(segment, bar):
+        position, end = segment
+        attempt = 0
+
+        with open(segments_file, "r+b") as f:
+            while position <= end:
+                try:
+                    with requests.get(url, headers={"Range": f"bytes={position}-{end}"},
+                                      stream=True, timeout=30) as r:
+                        r.raise_for_status()
+                        if r.status_code != 206:
+                            raise _RangeNotHonored()
+
+                        f.seek(position)
+                        for chunk in r.iter_content(chunk_size=_SEGMENT_READ_SIZE):
+                            if cancelled.is_set():
+                                return
+                            chunk = chunk[:end + 1 - position]
                             f.write(chunk)
-                            bar.update(len(chunk))
-    except (
-        requests.Timeout,
-        requests.ConnectionError,
-        requests.HTTPError,
-        requests.TooManyRedirects
-    ) as e:
-        logging.debug(e)
-        if os.path.isfile(destination):
-            os.remove(destination)
+                            position += len(chunk)
+                            if bar:
+                                with progress_lock:
+                                    bar.update(len(chunk))
+
+                    if position <= end:
+                        raise requests.ConnectionError(
+                            f"Connection closed at byte {position} of segment ending at {end}")
+
+                except _transient_errors() as e:
+                    logging.debug(e)
+                    attempt += 1
+                    if attempt > retries:
+                        raise YurtException("Download interrupted.")
+                    if cancelled.wait(retry_wait):
+                        return
+
+    executor = ThreadPoolExecutor(max_workers=len(segments))
+    futures = []
+    try:
+        with progress as bar:
+            futures = [executor.submit(fetch_segment, s, bar) for s in segments]
+            for future in as_completed(futures):
+                future.result()
+    except BaseException:
+        cancelled.set()
+        for future in futures:
+            future.cancel()
+        # Running segments stop at their next read.
+        executor.shutdown(wait=True)
+        # Segments complete out of order, so a partial file can't be resumed.
+        os.remove(segments_file)
+        raise
+    executor.shutdown()
+
+    # Segments arrive out of order, so the file is hashed once they are all in.
+    return _hash_file(segments_file, hashlib.sha256())
+
+
+def download_file(url: str, destination: str, show_progress=False, sha256: str = None,
+                  retries=5, retry_wait=2, connections=1):
+    """
+    Download `url` to `destination` through `destination`.part, or
+    `destination`.segments for segmented downloads.
+
+    Interrupted downloads are resumed with HTTP Range requests, both within
+    this call, up to `retries` times, and by later calls, as the .part file
+    is kept. On one connection, the SHA-256 of the file is computed while it
+    downloads. Segmented downloads are hashed in a pass over the finished
+    file, since segments arrive out of order.
+    - sha256: str
+        Expected SHA-256. The download is discarded if it does not match.
+    - connections: int
+        Download byte ranges on this many connections at once. Falls back to
+        one connection if the server does not support range requests, or to
+        resume a previous download.
+
+    Returns the SHA-256 of the file.
+    """
+    import requests
+
+    part_file = f"{destination}.part"
+    segments_file = f"{destination}.segments"
 
+    try:
+        # Left over from a segmented download that was killed. Its segments
+        # are incomplete in unknown places, so it can't be resumed.
+        if os.path.isfile(segments_file):
+            os.remove(segments_file)
+
+        total_bytes = None
+        if connections > 1 and not os.path.isfile(part_file):
+            total_bytes = _range_length(url)
+            if total_bytes is None:
+                logging.debug("Range requests are not supported. Using one connection.")
+
+        hash_ = None
+        if total_bytes:
+            try:
+                hash_ = _download_segments(
+                    url, segments_file, total_bytes, connections, show_progress, retries, retry_wait)
+                os.replace(segments_file, part_file)
+            except _RangeNotHonored:
+                logging.debug("Server ignored a range request. Using one connection.")
+
+        if hash_ is None:
+            hash_ = _download_stream(url, part_file, show_progress, retries, retry_wait)
+
+    except requests.RequestException as e:
+        logging.debug(e)
         raise YurtException("Download error")
     except OSError as e:
         logging.debug(e)
-        if os.path.isfile(destination):
-            os.remove(destination)
-
         raise YurtException("Write error")
 
+    digest = hash_.hexdigest()
+    if sha256 and digest != sha256:
+        os.remove(part_file)
+        raise YurtException("Downloaded file is corrupted. Please try again.")
+
+    os.replace(part_file, destination)
+    record_sha256(destination, digest)
+    return digest
+
+
+def _sha256_record_file(file_path: str):
+    return f"{file_path}.sha256.json"
+
 
-def is_sha256(file_path: str, sha256: str):
+def _file_identity(file_path: str):
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+
+
+def record_sha256(file_path: str, sha256: str):
+    """
+    Remember that `file_path` has been hashed, alongside it, for is_sha256.
+    """
+    import json
+
+    try:
+        with open(_sha256_record_file(file_path), "w") as f:
+            json.dump(dict(_file_identity(file_path), sha256=sha256), f)
+    except OSError as e:
+        logging.debug(f"Could not record hash of {file_path}: {e}")
+
+
+def is_sha256(file_path: str, sha256: str, trust_record=True):
+    """
+    Check the SHA-256 of a file. A hash recorded with record_sha256 is
+    trusted while the file's size, modification time and inode are unchanged.
+    - trust_record: bool
+        If False, always hash the file.
+    """
     import hashlib
+    import json
 
-    sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
+    if trust_record:
+        try:
+            with open(_sha256_record_file(file_path), "r") as f:
+                record = json.load(f)
+            if record == dict(_file_identity(file_path), sha256=record.get("sha256")):
+                logging.debug(f"Using recorded hash of {file_path}")
+                return record["sha256"] == sha256
+        except (OSError, ValueError) as e:
+            logging.debug(f"No usable hash record for {file_path}: {e}")
+
+    digest = _hash_file(file_path, hashlib.sha256()).hexdigest()
+    record_sha256(file_path, digest)
+    return digest == sha256
 
-    return sha256_hash.hexdigest() == sha256
+
+def is_http_reachable(port: int, host: str = "127.0.0.1", timeout: float = 1.0):
+    """
+    Cheap liveness probe: one TCP connection and a minimal HTTP request.
+    A bare connect is not enough as VirtualBox's NAT accepts forwarded
+    connections before the guest does.
+    """
+    import socket
+
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as s:
+            s.sendall(f"GET / HTTP/1.0\r\nHost: {host}\r\n\r\n".encode())
+            return s.recv(5) == b"HTTP/"
+    except OSError as e:
+        logging.debug(f"Probe {host}:{port} failed: {e}")
+        return False
 
 
 def retry(fn, retries=3, wait_time=5, message=None):
@@ -193,6 +487,128 @@ def run(cmd: List[str], show_spinner: bool = False, **kwargs):
         return _run(cmd, **kwargs)
 
 
+# path => {"lock": RLock, "depth": int, "file": file}, for locks held by this process.
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+def _lock_file(f, blocking: bool):
+    """
+    Take an exclusive advisory lock on an open file. Returns False if
+    `blocking` is False and another process holds it.
+    """
+    from yurt import config
+
+    if config.system == config.System.windows:
+        import msvcrt
+
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                sleep_for(0.1)
+    else:
+        import fcntl
+
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(f.fileno(), flags)
+            return True
+        except BlockingIOError:
+            return False
+
+
+def _unlock_file(f):
+    from yurt import config
+
+    if config.system == config.System.windows:
+        import msvcrt
+
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def file_lock(path: str, wait_message: str = None):
+    """
+    Hold an exclusive lock on `path` across processes. Threads of this
+    process take turns, and the lock can be re-entered by its holder.
+    - wait_message: str
+        Logged if the lock is held elsewhere and we have to wait for it.
+    """
+    with _file_locks_guard:
+        entry = _file_locks.setdefault(
+            path, {"lock": threading.RLock(), "depth": 0, "file": None})
+
+    with entry["lock"]:
+        if entry["depth"] == 0:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            f = open(path, "a")
+            try:
+                if not _lock_file(f, blocking=False):
+                    if wait_message:
+                        logging.info(wait_message)
+                    _lock_file(f, blocking=True)
+            except BaseException:
+                f.close()
+                raise
+            entry["file"] = f
+
+        entry["depth"] += 1
+        try:
+            yield
+        finally:
+            entry["depth"] -= 1
+            if entry["depth"] == 0:
+                f, entry["file"] = entry["file"], None
+                _unlock_file(f)
+                f.close()
+
+
+def yurt_command(*args: str) -> List[str]:
+    """
+    Command line that runs yurt with `args`, from source or a frozen build.
+    """
+    import sys
+
+    if getattr(sys, "frozen", False):
+        return [sys.executable, *args]
+    else:
+        return [sys.executable, "-m", "yurt.cli", *args]
+
+
+def spawn_detached(cmd: List[str]):
+    """
+    Start `cmd` in the background, detached from this process and its terminal.
+    """
+    import subprocess
+    from yurt import config
+
+    kwargs = {}
+    if config.system == config.System.windows:
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | \
+            subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+
+    logging.debug(f"Spawning: {cmd}")
+    subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        **kwargs
+    )
+
+
 def random_string(length=10):
     import random
     import string
@@ -216,3 +632,5 @@ def prompt_user(message: str, options: List[str] = None):
 
     except KeyboardInterrupt:
         raise YurtException("User Canceled")
+    except EOFError:
+        raise YurtException("No response: input is not available.")
@@ -1,10 +1,12 @@
 from .vm import (
     State,
+    VmInfo,
     delete_instance_files,
     destroy,
     ensure_is_ready,
     info,
     init,
+    invalidate_state,
     launch_ssh,
     start,
     state,
@@ -0,0 +1,137 @@
+"""
+Provision the VM with a single uploaded script.
+
+Steps are composed into one shell script that runs in one SSH session.
+Each completed step leaves a marker in the VM so that a re-run after a
+partial failure skips what is already done.
+"""
+import logging
+import os
+from typing import List, NamedTuple
+
+from yurt import config
+from yurt.exceptions import VMException
+
+
+MARKERS_DIR = "/var/lib/yurt/provision"
+_STATUS_PREFIX = "@@yurt-step"
+_HEREDOC_DELIMITER = "YURT_PROVISION_EOF"
+
+
+class Step(NamedTuple):
+    name: str
+    description: str
+    command: str
+
+
+def heredoc(command: str, content: str):
+    """
+    Feed `content` to `command`'s stdin.
+    """
+    if not content.endswith("\n"):
+        content += "\n"
+    return f"{command} <<'{_HEREDOC_DELIMITER}'\n{content}{_HEREDOC_DELIMITER}"
+
+
+def write_file(path: str, content: str):
+    return heredoc(f"cat > {path}", content)
+
+
+def _script(steps: List[Step]):
+    lines = [
+        "#!/bin/bash",
+        f"mkdir -p {MARKERS_DIR}",
+    ]
+
+    for step in steps:
+        marker = f"{MARKERS_DIR}/{step.name}"
+        lines.extend([
+            f"if [ -f {marker} ]; then",
+            f"    echo '{_STATUS_PREFIX} skip {step.name}'",
+            "else",
+            f"    echo '{_STATUS_PREFIX} start {step.name}'",
+            "    (",
+            "    set -e",
+            step.command,
+            "    ) 2>&1",
+            "    status=$?",
+            "    if [ $status -ne 0 ]; then",
+            f"        echo '{_STATUS_PREFIX} fail {step.name}'",
+            "        exit $status",
+            "    fi",
+            f"    touch {marker}",
+            f"    echo '{_STATUS_PREFIX} done {step.name}'",
+            "fi",
+        ])
+
+    return "\n".join(lines) + "\n"
+
+
+class _StatusStream:
+    """
+    Receives the script's output. Logs step status lines as they arrive.
+    """
+
+    def __init__(self, steps: List[Step]):
+        self.descriptions = {step.name: step.description for step in steps}
+        self.failed_step = None
+        self._buffer = ""
+
+    def write(self, data: str):
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            self._handle_line(line.rstrip("\r"))
+
+    def flush(self):
+        pass
+
+    def _handle_line(self, line: str):
+        if not line.startswith(_STATUS_PREFIX):
+            logging.debug(line)
+            return
+
+        try:
+            _, status, name = line.split(" ", 2)
+        except ValueError:
+            logging.debug(f"Unexpected status line: {line}")
+            return
+
+        description = self.descriptions.get(name, name)
+        if status == "start":
+            logging.info(f"{description}...")
+        elif status == "skip":
+            logging.info(f"{description}: already done.")
+        elif status == "fail":
+            self.failed_step = name
+        else:
+            logging.debug(f"{description}: {status}")
+
+
+def run(name: str, steps: List[Step]):
+    """
+    Run `steps` in the VM, in order, as root.
+    Steps that completed in a previous run are skipped.
+    """
+    import tempfile
+    from . import ssh
+
+    remote_script = f"/tmp/{config.app_name}-provision-{name}.sh"
+
+    fd, local_script = tempfile.mkstemp(suffix=".sh")
+    try:
+        with os.fdopen(fd, "w", newline="\n") as f:
+            f.write(_script(steps))
+        ssh.put_file(local_script, remote_script)
+    finally:
+        os.remove(local_script)
+
+    status_stream = _StatusStream(steps)
+    try:
+        ssh.run_cmd(f"sudo bash {remote_script}", out_stream=status_stream)
+    except VMException as e:
+        failed_step = status_stream.failed_step
+        if failed_step:
+            description = status_stream.descriptions[failed_step]
+            raise VMException(f"Provisioning failed at: {description}")
+        raise e
@@ -1,6 +1,7 @@
 from io import StringIO
+import atexit
 import logging
-from contextlib import contextmanager
+import threading
 
 from fabric import Connection as FabricConnection
 from invoke.exceptions import Failure, ThreadException, UnexpectedExit
@@ -9,27 +10,78 @@ from yurt import config
 from yurt.exceptions import VMException
 
 
-@contextmanager
-def _connection():
-    connection = FabricConnection(
-        "localhost",
-        user=config.user_name,
-        port=config.get_config(config.Key.ssh_port),
-        connect_kwargs={"key_filename": config.ssh_private_key_file}
-    )
-    try:
-        yield connection
-    finally:
-        connection.close()
+class _ConnectionPool:
+    """
+    Keeps one authenticated SSH transport to the VM alive for the whole process.
+    Each command runs on a new channel of that transport.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connection = None
+        self._port = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self):
+        port = config.get_config(config.Key.ssh_port)
+
+        with self._lock:
+            connection = self._connection
+            if connection and self._port == port and connection.is_connected:
+                self.hits += 1
+                return connection
+
+            self._close()
+            self.misses += 1
+
+            connection = FabricConnection(
+                "localhost",
+                user=config.user_name,
+                port=port,
+                connect_kwargs={"key_filename": config.ssh_private_key_file}
+            )
+            connection.open()
+            connection.transport.set_keepalive(config.ssh_keepalive_interval)
+
+            self._connection, self._port = connection, port
+            return connection
+
+    def discard(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._connection:
+            try:
+                self._connection.close()
+            except Exception as e:
+                logging.debug(f"Error closing SSH connection: {e}")
+            self._connection = None
+
+
+_pool = _ConnectionPool()
+
+
+@atexit.register
+def close():
+    logging.debug(f"SSH connection pool: {pool_stats()}")
+    _pool.discard()
+
+
+def pool_stats():
+    return {"hits": _pool.hits, "misses": _pool.misses}
 
 
 def _connection_exec(func, *args, **kwargs):
     try:
         return func(*args, **kwargs)
     except ssh_exception.NoValidConnectionsError:
+        _pool.discard()
         raise VMException("SSH connection failed")
-    except ssh_exception.SSHException as e:
+    except (ssh_exception.SSHException, EOFError) as e:
         logging.debug(e)
+        _pool.discard()
         raise VMException("SSH connection failed")
     except UnexpectedExit as e:
         logging.debug(e)
@@ -43,19 +95,23 @@ def _connection_exec(func, *args, **kwargs):
             "Background I/O threads encountered exceptions.")
 
 
-def run_cmd(cmd, hide_output=False, stdin=None):
+def run_cmd(cmd, hide_output=False, stdin=None, out_stream=None):
+    """
+    out_stream: Optional file-like object that receives stdout as it arrives.
+    """
     in_stream = None
     if stdin:
         in_stream = StringIO(initial_value=stdin)
 
-    with _connection() as connection:
-        result = _connection_exec(
-            connection.run, cmd, hide=hide_output, in_stream=in_stream
-        )
+    connection = _connection_exec(_pool.get)
+    result = _connection_exec(
+        connection.run, cmd, hide=hide_output, in_stream=in_stream,
+        out_stream=out_stream
+    )
 
-        return (result.stdout, result.stderr)
+    return (result.stdout, result.stderr)
 
 
 def put_file(local_path: str, remote_path: str):
-    with _connection() as connection:
-        _connection_exec(connection.put, local_path, remote_path)
+    connection = _connection_exec(_pool.get)
+    _connection_exec(connection.put, local_path, remote_path)
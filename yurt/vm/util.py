@@ -1,5 +1,7 @@
+import logging
+
 from yurt import config, util
-from yurt.exceptions import VMException
+from yurt.exceptions import LXCException, VMException
 from . import vbox
 
 
@@ -56,12 +58,46 @@ def wait_for_ssh():
 
 
 def setup_port_forwarding():
-    ssh_port = _get_unused_port()
     vm_name_ = vm_name()
 
-    vbox.setup_port_forwarding(vm_name_, "ssh", ssh_port, 22)
-    config.set_config(config.Key.ssh_port, ssh_port)
+    with config.transaction() as updates:
+        ssh_port = _get_unused_port()
+        vbox.setup_port_forwarding(vm_name_, "ssh", ssh_port, 22)
+        updates[config.Key.ssh_port] = ssh_port
+
+        lxd_port = _get_unused_port()
+        vbox.setup_port_forwarding(vm_name_, "lxd", lxd_port, 80)
+        updates[config.Key.lxd_port] = lxd_port
+
+
+def is_ready_fast():
+    """
+    True if a previous command fully verified the VM and LXD still answers
+    with the same fingerprint: same LXD server process, network and profile.
+    """
+    from yurt.lxc import util as lxc_util
+
+    fingerprint = config.get_config(config.Key.readiness_fingerprint)
+    lxd_port = config.get_config(config.Key.lxd_port)
+    if not (fingerprint and lxd_port):
+        return False
+
+    # The probe times out quickly if the VM is gone, where an API request
+    # through VirtualBox's NAT could hang.
+    if not util.is_http_reachable(lxd_port):
+        logging.debug("LXD probe failed. Running full readiness checks.")
+    else:
+        try:
+            if lxc_util.get_readiness_fingerprint() == fingerprint:
+                return True
+            logging.debug("LXD has changed. Running full readiness checks.")
+        except LXCException as e:
+            logging.debug(f"{e.message} Running full readiness checks.")
+
+    clear_readiness()
+    return False
+
 
-    lxd_port = _get_unused_port()
-    vbox.setup_port_forwarding(vm_name_, "lxd", lxd_port, 80)
-    config.set_config(config.Key.lxd_port, lxd_port)
+def clear_readiness():
+    if config.get_config(config.Key.readiness_fingerprint):
+        config.set_config(config.Key.readiness_fingerprint, None)
@@ -1,7 +1,9 @@
 import os
 import logging
 import re
-from typing import Dict, List
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, NamedTuple, Tuple, Union
 
 from yurt import config
 from yurt import util as yurt_util
@@ -34,7 +36,7 @@ def _get_vboxmanage_executable_windows():
     raise VBoxException("VBoxManage executable not found")
 
 
-def _get_vboxmanage_executable():
+def _find_vboxmanage_executable():
     if config.system == config.System.windows:
         return _get_vboxmanage_executable_windows()
     else:
@@ -42,11 +44,41 @@ def _get_vboxmanage_executable():
         raise VBoxException(f"Platform {config.system} not supported")
 
 
-def _run_vbox(args: List[str], **kwargs):
+def _is_executable(path: str):
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+# Resolved once per process by _get_vboxmanage_executable.
+_executable = {"path": None}
+
+
+def _get_vboxmanage_executable():
     """
-    See yurt.util.run for **kwargs documentation.
+    VBoxManage's path. In order of preference: the YURT_VBOXMANAGE environment
+    variable, the path found by a previous run, if it is still valid, or a
+    search of the usual install locations. Found paths are saved in config.
     """
+    if _executable["path"]:
+        return _executable["path"]
+
+    override = os.environ.get("YURT_VBOXMANAGE")
+    if override:
+        if not _is_executable(override):
+            raise VBoxException(
+                f"YURT_VBOXMANAGE is set to {override}, which is not an executable.")
+        path = override
+    else:
+        path = config.get_config(config.Key.vboxmanage_path)
+        if not _is_executable(path):
+            path = _find_vboxmanage_executable()
+            logging.debug(f"Found VBoxManage at {path}")
+            config.set_config(config.Key.vboxmanage_path, path)
+
+    _executable["path"] = path
+    return path
+
 
+def _execute(args: List[str], **kwargs):
     executable = _get_vboxmanage_executable()
     cmd = [executable, "-q"] + args
 
@@ -54,6 +86,153 @@ def _run_vbox(args: List[str], **kwargs):
         return yurt_util.run(cmd, **kwargs)
     except CommandException as e:
         raise VBoxException(e.message)
+    except FileNotFoundError:
+        # Uninstalled or moved since it was found. Search again next time.
+        _executable["path"] = None
+        raise VBoxException(f"VBoxManage not found at {executable}")
+
+
+def _run_vbox(args: List[str], **kwargs):
+    """
+    Run a VBoxManage command that may change something. Snapshots are
+    discarded afterwards. See yurt.util.run for **kwargs documentation.
+    """
+    try:
+        return _execute(args, **kwargs)
+    finally:
+        invalidate_snapshots()
+
+
+# Parsers ###################################################################
+
+
+class VmListEntry(NamedTuple):
+    name: str
+    uuid: str
+
+
+class VmInfo(NamedTuple):
+    """
+    Parsed output of 'VBoxManage showvminfo --machinereadable'.
+    """
+    uuid: str
+    vm_state: str
+    memory: str
+    cpus: str
+    values: Dict[str, str]
+
+    @property
+    def is_running(self):
+        return self.vm_state == "running"
+
+    @classmethod
+    def parse(cls, values: Dict[str, str]):
+        return cls(
+            uuid=values["UUID"],
+            vm_state=values["VMState"],
+            memory=values["memory"],
+            cpus=values["cpus"],
+            values=values,
+        )
+
+
+class HostOnlyInterface(NamedTuple):
+    name: str
+    ip_address: str
+    network_mask: str
+    values: Dict[str, str]
+
+
+_VM_LIST_LINE = re.compile(r'^"(.*)" \{(.*)\}$')
+
+
+def parse_vm_list(output: str) -> List[VmListEntry]:
+    """
+    Output of 'VBoxManage list vms'.
+    """
+    entries = []
+    for line in output.splitlines():
+        match = _VM_LIST_LINE.match(line)
+        if match:
+            entries.append(VmListEntry(*match.groups()))
+    return entries
+
+
+def parse_machine_readable(output: str) -> Dict[str, str]:
+    """
+    key=value output of --machinereadable commands, with quotes removed.
+    """
+    values = {}
+    for line in output.splitlines():
+        key, sep, value = line.partition("=")
+        if sep:
+            values[key.strip('"')] = value.strip('"')
+    return values
+
+
+def parse_host_only_interfaces(output: str) -> Dict[str, HostOnlyInterface]:
+    """
+    Output of 'VBoxManage list hostonlyifs', by interface name.
+    Interfaces are blocks of "Key: value" lines separated by blank lines.
+    """
+    interfaces = {}
+
+    def add(values):
+        if values:
+            interface = HostOnlyInterface(
+                name=values.get("Name", ""),
+                ip_address=values.get("IPAddress", ""),
+                network_mask=values.get("NetworkMask", ""),
+                values=values,
+            )
+            interfaces[interface.name] = interface
+
+    values = {}
+    for line in output.splitlines():
+        if not line.strip():
+            add(values)
+            values = {}
+            continue
+
+        key, sep, value = line.partition(":")
+        if not sep:
+            logging.error(f"Error processing line {line}")
+            raise VBoxException("Unexpected result from 'list hostonlyifs'")
+        values[key.strip()] = value.strip()
+    add(values)
+
+    return interfaces
+
+
+# Snapshots #################################################################
+
+
+# Parsed output of read-only commands, by command.
+# Entries expire after config.vm_state_ttl and are discarded by _run_vbox.
+_snapshots: Dict[Tuple[str, ...], Tuple[float, object]] = {}
+
+
+def invalidate_snapshots():
+    _snapshots.clear()
+
+
+def _query(args: List[str], parse: Callable[[str], object]):
+    """
+    Parsed output of a read-only command, from a recent snapshot if there
+    is one. Results are shared and must not be modified.
+    """
+    key = tuple(args)
+    now = time.monotonic()
+    cached = _snapshots.get(key)
+    if cached and now - cached[0] < config.vm_state_ttl:
+        return cached[1]
+
+    result = parse(_execute(args))
+    _snapshots[key] = (now, result)
+    return result
+
+
+# Commands ##################################################################
 
 
 def import_vm(vm_name: str, appliance_file: str, base_folder, memory):
@@ -71,35 +250,99 @@ def import_vm(vm_name: str, appliance_file: str, base_folder, memory):
     _run_vbox(cmd, show_spinner=True)
 
 
-def modify_vm(vm_name: str, settings: Dict[str, str]):
+def _option_args(value: Union[str, List[str]]) -> List[str]:
+    return [value] if isinstance(value, str) else list(value)
+
+
+_ENUM_TOKEN = re.compile(r"^[A-Za-z][A-Za-z0-9_-]*$")
+
+
+def _normalize_token(arg: str):
+    if arg.lower().startswith("0x"):
+        try:
+            return str(int(arg, 16))
+        except ValueError:
+            return arg
+    if _ENUM_TOKEN.match(arg):
+        return arg.lower()
+    # Paths and names are compared verbatim.
+    return arg
+
+
+def _normalize_setting(args: List[str]):
+    """
+    Comparable form of a setting, whether given to modifyvm or shown by
+    showvminfo. e.g. ["0x3F8", "4"] and "0x03f8,4" both become "1016,4".
+    Hex numbers and keywords like "on" or "virtio" are normalized.
+    """
+    return ",".join(_normalize_token(arg) for arg in args)
+
+
+def modify_vm(vm_name: str, settings: Dict[str, Union[str, List[str]]], skip_unchanged=False):
+    """
+    Apply settings with one modifyvm command.
+    - settings: Dict[str, Union[str, List[str]]]
+        modifyvm options without the leading "--", and their arguments.
+    - skip_unchanged: bool
+        Leave out settings that showvminfo already reports. Settings that
+        showvminfo words differently are applied anyway.
+    """
+    if skip_unchanged:
+        current = get_vm_info(vm_name).values
+        settings = {
+            k: v for k, v in settings.items()
+            if k not in current or
+            _normalize_setting(current[k].split(",")) != _normalize_setting(_option_args(v))
+        }
+        if not settings:
+            logging.debug(f"Settings of {vm_name} are up to date.")
+            return
+
     options = []
     for k, v in settings.items():
         options.append(f"--{k}")
-        options.append(v)
+        options.extend(_option_args(v))
 
     cmd = ["modifyvm", vm_name] + options
     _run_vbox(cmd)
 
 
-def list_vms():
-    def parse_line(line):
-        match = re.search(r'"(.*)" \{(.*)\}', line)
-        return match.groups()
+@contextmanager
+def batch_modify_vm(vm_name: str, skip_unchanged=True):
+    """
+    Collect settings and apply them with a single modify_vm when the block
+    exits. Nothing is applied if the block raises.
+
+        with vbox.batch_modify_vm(vm_name) as settings:
+            settings["memory"] = "2048"
+            ...
+    """
+    settings: Dict[str, Union[str, List[str]]] = {}
+    yield settings
+    if settings:
+        modify_vm(vm_name, settings, skip_unchanged=skip_unchanged)
+
+
+def list_vms() -> List[VmListEntry]:
+    return _query(["list", "vms"], parse_vm_list)
+
+
+def get_vm_info(vm_name: str) -> VmInfo:
+    def parse(output):
+        return VmInfo.parse(parse_machine_readable(output))
 
-    output = _run_vbox(["list",  "vms"])
-    return list(map(parse_line, output.splitlines()))
+    return _query(["showvminfo", vm_name, "--machinereadable"], parse)
 
 
-def get_vm_info(vm_name: str):
-    cmd = ["showvminfo", vm_name, "--machinereadable"]
-    output = _run_vbox(cmd)
-    info_list = map(lambda l: l.split("=", 1), output.splitlines())
-    return dict(info_list)
+def serial_console_settings(console_file_path: str):
+    return {
+        "uart1": ["0x3F8", "4"],
+        "uartmode1": ["file", console_file_path],
+    }
 
 
 def attach_serial_console(vm_name: str, console_file_path: str):
-    _run_vbox(["modifyvm", vm_name, "--uart1", "0x3F8", "4"])
-    _run_vbox(["modifyvm", vm_name, "--uartmode1", "file", console_file_path])
+    modify_vm(vm_name, serial_console_settings(console_file_path), skip_unchanged=True)
 
 
 def start_vm(vm_name: str):
@@ -116,51 +359,26 @@ def stop_vm(vm_name: str, force=False):
     _run_vbox(cmd)
 
 
-def list_host_only_interfaces():
-    def get_iface_name(line):
-        match = re.search(r"^Name: +(.*)", line)
-        if match:
-            return match.group(1)
-
-    interfaces = map(
-        get_iface_name,
-        _run_vbox(["list", "hostonlyifs"]).splitlines()
-    )
-    return list(filter(None, interfaces))
-
+def _host_only_interfaces() -> Dict[str, HostOnlyInterface]:
+    return _query(["list", "hostonlyifs"], parse_host_only_interfaces)
 
-def get_interface_info(interface_name: str):
-    lines = _run_vbox(["list", "hostonlyifs"]).splitlines()
 
-    interface_info: Dict[str, str] = {}
-    processing_interface_values = False
-    for line in lines:
-        match = re.search(r"^Name: +{}$".format(interface_name), line)
-        if match:
-            processing_interface_values = True
+def list_host_only_interfaces():
+    return list(_host_only_interfaces())
 
-        try:
-            if processing_interface_values:
-                if len(line) == 0:
-                    return interface_info
-                key, value = line.split(":", 1)
-                key, value = key.strip(), value.strip()
-                interface_info[key] = value
-
-        except ValueError as e:
-            logging.error(
-                "Error processing line {0}: {1}".format(line, e))
-            raise VBoxException(
-                "Unexpected result from 'list hostonlyifs'")
 
-    raise VBoxException(
-        "Interface {} not found".format(interface_name))
+def get_interface_info(interface_name: str) -> HostOnlyInterface:
+    try:
+        return _host_only_interfaces()[interface_name]
+    except KeyError:
+        raise VBoxException(
+            "Interface {} not found".format(interface_name))
 
 
 def create_hostonly_interface():
-    old_interfaces = set(list_host_only_interfaces())
+    old_interfaces = set(_host_only_interfaces())
     _run_vbox(["hostonlyif", "create"])
-    new_interfaces = set(list_host_only_interfaces())
+    new_interfaces = set(_host_only_interfaces())
     try:
         return new_interfaces.difference(old_interfaces).pop()
     except KeyError:
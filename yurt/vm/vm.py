@@ -2,6 +2,7 @@ import logging
 import os
 import shutil
 from enum import Enum
+from typing import Dict
 
 from yurt import config
 from yurt import util as yurt_util
@@ -9,6 +10,7 @@ from yurt.exceptions import (ConfigReadException, ConfigWriteException,
                              VBoxException, VMException, YurtException)
 
 from . import util, vbox
+from .vbox import VmInfo
 
 
 class State(Enum):
@@ -17,41 +19,51 @@ class State(Enum):
     Running = 3
 
 
+def _get_vm_info(vm_name: str) -> VmInfo:
+    try:
+        return vbox.get_vm_info(vm_name)
+    except (VBoxException, KeyError) as e:
+        logging.debug(e)
+        raise VMException("An error occurred while fetching VM status.")
+
+
+def invalidate_state():
+    """
+    Forget cached VM information. Call after anything that changes the VM's state.
+    """
+    vbox.invalidate_snapshots()
+
+
 def state():
     try:
         vm_name = util.vm_name()
-        vm_info = vbox.get_vm_info(vm_name)
-        is_running = vm_info["VMState"].strip('"') == "running"
-        return State.Running if is_running else State.Stopped
     except VMException:
         return State.NotInitialized
-    except (VBoxException, KeyError) as e:
-        logging.debug(e)
-        raise VMException("An error occurred while fetching VM status.")
+
+    vm_info = _get_vm_info(vm_name)
+    return State.Running if vm_info.is_running else State.Stopped
 
 
 def info():
     vm_state = state()
     if vm_state != State.NotInitialized:
-        vm_name = util.vm_name()
-        try:
-            vm_info = vbox.get_vm_info(vm_name)
-            return {
-                "State": "Running"
-                if vm_info["VMState"].strip('"') == "running"
-                else "Stopped",
-                "Memory": vm_info["memory"],
-                "CPUs": vm_info["cpus"],
-            }
-        except (VBoxException, KeyError) as e:
-            logging.debug(e)
-            raise VMException("An error occurred while fetching VM status.")
+        vm_info = _get_vm_info(util.vm_name())
+        return {
+            "State": "Running" if vm_info.is_running else "Stopped",
+            "Memory": vm_info.memory,
+            "CPUs": vm_info.cpus,
+        }
     else:
         return {"State": "Not Initialized"}
 
 
-def download_image():
-    if os.path.isfile(config.image) and yurt_util.is_sha256(config.image, config.image_sha256):
+def download_image(connections: int = config.image_download_connections, verify=False):
+    """
+    - verify: bool
+        Hash a cached image even if it was verified before.
+    """
+    if os.path.isfile(config.image) and \
+            yurt_util.is_sha256(config.image, config.image_sha256, trust_record=not verify):
         logging.info("Using cached image...")
     else:
         logging.info(f"Downloading image from {config.image_url}")
@@ -60,16 +72,16 @@ def download_image():
         if not os.path.isdir(image_dir):
             os.mkdir(image_dir)
 
-        yurt_util.download_file(
-            config.image_url, config.image, show_progress=True
-        )
-
-        if not yurt_util.is_sha256(config.image, config.image_sha256):
-            raise VMException(
-                "Error downloading image. Re-run 'init'.")
+        try:
+            yurt_util.download_file(
+                config.image_url, config.image, show_progress=True,
+                sha256=config.image_sha256, connections=connections
+            )
+        except YurtException as e:
+            raise VMException(f"Error downloading image: {e.message}")
 
 
-def init():
+def init(download_connections: int = config.image_download_connections, verify_image=False):
     from uuid import uuid4
 
     if state() is not State.NotInitialized:
@@ -80,7 +92,7 @@ def init():
         )
         return
 
-    download_image()
+    download_image(connections=download_connections, verify=verify_image)
 
     vm_name = "{0}-{1}".format(config.app_name, uuid4())
 
@@ -88,6 +100,7 @@ def init():
         logging.info("Importing appliance...")
         vbox.import_vm(vm_name, config.image,
                        config.vm_install_dir, config.vm_memory)
+        invalidate_state()
 
         config.set_config(config.Key.vm_name, vm_name)
 
@@ -96,7 +109,11 @@ Accept VirtualBox's prompt to allow networking with the host.
 Press enter to continue...""")
         _attach_config_disk()
         _attach_storage_pool_disk()
-        _setup_network()
+
+        # One modifyvm for all settings. start() finds the console already set.
+        with vbox.batch_modify_vm(vm_name, skip_unchanged=False) as settings:
+            _setup_network(settings)
+            settings.update(vbox.serial_console_settings(_console_file()))
 
     except (
         ConfigWriteException,
@@ -115,6 +132,10 @@ Press enter to continue...""")
         raise VMException("Initialization failed")
 
 
+def _console_file():
+    return os.path.join(config.vm_install_dir, "console.log")
+
+
 def start():
     vm_state = state()
     vm_name = util.vm_name()
@@ -128,11 +149,12 @@ def start():
 
     try:
         logging.info("Starting up...")
+        util.clear_readiness()
 
-        console_file_name = os.path.join(config.vm_install_dir, "console.log")
-        vbox.attach_serial_console(vm_name, console_file_name)
+        vbox.attach_serial_console(vm_name, _console_file())
 
         vbox.start_vm(vm_name)
+        invalidate_state()
 
         yurt_util.sleep_for(5, show_spinner=True)
         util.setup_port_forwarding()
@@ -143,7 +165,40 @@ def start():
         raise VMException("Start up failed")
 
 
-def ensure_is_ready(prompt_init=True, prompt_start=True):
+def _record_readiness():
+    """
+    Remember that the VM and LXD passed all checks so that later commands
+    can get by with util.is_ready_fast().
+    """
+    from yurt.lxc import util as lxc_util
+
+    try:
+        config.set_config(
+            config.Key.readiness_fingerprint, lxc_util.get_readiness_fingerprint())
+    except YurtException as e:
+        logging.debug(f"Readiness not recorded: {e.message}")
+
+
+def ensure_is_ready(prompt_init=True, prompt_start=True,
+                    download_connections: int = config.image_download_connections,
+                    verify_image=False):
+    if util.is_ready_fast():
+        return
+
+    # Single flight: concurrent commands wait for the one that is already
+    # initializing or starting the VM, then reuse its work.
+    with yurt_util.file_lock(
+            config.vm_lock_file,
+            wait_message="Waiting for another yurt command to get the VM ready..."):
+        invalidate_state()
+        if util.is_ready_fast():
+            return
+
+        _ensure_is_ready(prompt_init, prompt_start,
+                         download_connections, verify_image)
+
+
+def _ensure_is_ready(prompt_init, prompt_start, download_connections, verify_image):
     initialize_vm_prompt = "Yurt has not been initialized. Initialize now?"
     start_vm_prompt = "Yurt is not running. Start up now?"
 
@@ -156,7 +211,8 @@ def ensure_is_ready(prompt_init=True, prompt_start=True):
 
         if initialize_vm:
             try:
-                init()
+                init(download_connections=download_connections,
+                     verify_image=verify_image)
                 logging.info("Done.")
             except YurtException as e:
                 logging.error(e.message)
@@ -181,12 +237,16 @@ def ensure_is_ready(prompt_init=True, prompt_start=True):
         else:
             raise VMException("Not started")
 
+    if state() == State.Running:
+        _record_readiness()
+
 
 def stop(force=False):
     vm_state = state()
     vm_name = util.vm_name()
 
     def confirm_shutdown():
+        invalidate_state()
         if state() == State.Running:
             raise VMException("VM is still running.")
 
@@ -194,12 +254,14 @@ def stop(force=False):
         logging.info("Yurt is not running.")
     else:
         try:
+            util.clear_readiness()
             if force:
                 logging.info("Forcing shutdown...")
             else:
                 logging.info("Attempting to shut down gracefully...")
 
             vbox.stop_vm(vm_name, force=force)
+            invalidate_state()
             yurt_util.retry(confirm_shutdown, retries=6, wait_time=10)
         except VBoxException as e:
             logging.error(e.message)
@@ -216,6 +278,7 @@ def destroy():
 
     try:
         vbox.destroy_vm(vm_name)
+        invalidate_state()
         interface_name = config.get_config(config.Key.interface)
 
         vbox.remove_hostonly_interface(interface_name)
@@ -261,30 +324,32 @@ def put_file(local_path: str, remote_path: str):
     ssh.put_file(local_path, remote_path)
 
 
-def _setup_network():
-    vm_name = util.vm_name()
+def _setup_network(settings: Dict):
+    """
+    Create a host-only interface for the VM and add network settings for
+    it to `settings`, a batch of modify_vm settings.
+    """
     try:
         interface_name = vbox.create_hostonly_interface()
         interface_info = vbox.get_interface_info(interface_name)
-        ip_address = interface_info["IPAddress"]
-        network_mask = interface_info["NetworkMask"]
-        config.set_config(config.Key.interface, interface_name)
-        config.set_config(config.Key.interface_ip_address, ip_address)
-        config.set_config(config.Key.interface_netmask, network_mask)
-
-        vbox.modify_vm(
-            vm_name,
-            {
-                "nic1": "nat",
-                "nictype1": "virtio",
-                "natnet1": "10.0.2.0/24",
-                "natdnshostresolver1": "on",
-                "nic2": "hostonly",
-                "nictype2": "virtio",
-                "hostonlyadapter2": interface_name,
-                "nicpromisc2": "allow-all",
-            },
-        )
+        ip_address = interface_info.ip_address
+        network_mask = interface_info.network_mask
+        config.set_many({
+            config.Key.interface: interface_name,
+            config.Key.interface_ip_address: ip_address,
+            config.Key.interface_netmask: network_mask,
+        })
+
+        settings.update({
+            "nic1": "nat",
+            "nictype1": "virtio",
+            "natnet1": "10.0.2.0/24",
+            "natdnshostresolver1": "on",
+            "nic2": "hostonly",
+            "nictype2": "virtio",
+            "hostonlyadapter2": interface_name,
+            "nicpromisc2": "allow-all",
+        })
 
     except VBoxException as e:
         logging.error(e.message)